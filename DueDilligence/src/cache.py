@@ -26,35 +26,50 @@ class AsyncInFlightCache:
         key: str,
         compute_coroutine: Callable[[], Awaitable[Any]],
     ) -> Any:
+        """
+        Returns the cached value, or computes it once for all concurrent callers.
+        Callers waiting on a computation whose caller was cancelled compute it themselves.
+        """
+        while True:
+            with self.lock:
+                if key in self.cache:
+                    return self.cache[key]
+
+                fut = self.in_flight.get(key)
+                if fut is None:
+                    fut = asyncio.get_running_loop().create_future()
+                    self.in_flight[key] = fut
+                    break
+
+            # Another caller is computing it; wait without cancelling its future
+            await asyncio.wait([fut])
+            if not fut.cancelled():
+                return fut.result()
+
+        try:
+            result = await compute_coroutine()
+        except asyncio.CancelledError:
+            with self.lock:
+                fut.cancel()
+                del self.in_flight[key]
+            raise
+        except Exception as e:
+            with self.lock:
+                fut.set_exception(e)
+                # Mark it retrieved, there may be no other caller waiting
+                fut.exception()
+                del self.in_flight[key]
+            raise
+
         with self.lock:
-            if key in self.cache:
-                return self.cache[key]
-
-            if key in self.in_flight:
-                fut = self.in_flight[key]
-            else:
-                fut = asyncio.Future()
-                self.in_flight[key] = fut
-
-        if not fut.done():
-            try:
-                result = await compute_coroutine()
-
-                with self.lock:
-                    self.cache[key] = result
-                    self.cache.move_to_end(key)
-                    if len(self.cache) > self.max_size:
-                        self.cache.popitem(last=False)
-
-                    fut.set_result(result)
-                    del self.in_flight[key]
-            except Exception as e:
-                with self.lock:
-                    fut.set_exception(e)
-                    del self.in_flight[key]
-                raise
-
-        return await fut
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+            fut.set_result(result)
+            del self.in_flight[key]
+        return result
 
 
 class Cache:
@@ -1,9 +1,16 @@
 import os
-import json, requests
+import json
+import asyncio
+import random
+from typing import Any, Awaitable, Callable
+
 import aiohttp
 from google import genai
+from google.genai import types
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from openai import APIConnectionError, AsyncOpenAI
+from rate_limiter import rate_limiter
+from token_buffer import num_tokens_from_string
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -11,6 +18,26 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 AZURE_API_KEY = os.getenv("AZURE_API_KEY")
 AZURE_URL = os.getenv("AZURE_URL")
 
+OPENAI_MODEL = "gpt-4o"
+AZURE_MODEL = "gpt-4o"
+GEMINI_MODEL = "gemini-2.0-flash"
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1))
+# Completion tokens assumed for each request when reserving tokens per minute
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", 1000))
+
+# Providers whose API returns structured function calls
+TOOL_CALLING_LLM_TYPES = ("openai", "azure", "gemini")
+
+GEMINI_TYPES = {
+    "string": "STRING",
+    "integer": "INTEGER",
+    "number": "NUMBER",
+    "boolean": "BOOLEAN",
+    "object": "OBJECT",
+    "array": "ARRAY",
+}
+
 
 class LLMClient:
     def __init__(self):
@@ -20,54 +47,264 @@ class LLMClient:
         self.headers = {"Content-Type": "application/json"}
         self.stop_token = None
         self.client_gemini = genai.Client(api_key=GEMINI_API_KEY)
-        self.client_openai = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=300.0)
+        # Retries go through the rate limiter instead of the client
+        self.client_openai = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=300.0, max_retries=0)
         self.azure_key = AZURE_API_KEY
         self.azure_url = AZURE_URL
+        # Created on the first Azure request, so it belongs to the running event loop
+        self.azure_session: aiohttp.ClientSession | None = None
+
+    async def close(self) -> None:
+        """Closes the HTTP session of the Azure requests."""
+        if self.azure_session is not None:
+            await self.azure_session.close()
+            self.azure_session = None
+
+    async def limited(
+        self,
+        provider: str,
+        model: str,
+        text: str,
+        request: Callable[[], Awaitable[tuple[Any, int | None]]],
+    ) -> Any:
+        """
+        Sends a request within the limits shared by all calls to the provider and model.
+        Rate limited (429), server and connection errors are retried up to LLM_MAX_RETRIES
+        times with exponential backoff and jitter.
+
+        Parameters:
+        text (str): The prompt, used to estimate the tokens of the request.
+        request (Callable): Sends the request and returns the result and the total tokens used, if known.
+
+        Returns:
+        Any: The result of the request.
+        """
+        limiter = rate_limiter.get(provider, model)
+        estimated_tokens = num_tokens_from_string(text) + LLM_EXPECTED_OUTPUT_TOKENS
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            async with limiter.slot(estimated_tokens):
+                try:
+                    result, used_tokens = await request()
+                except Exception as e:
+                    status, retry_after = error_status(e)
+                    retryable = (
+                        status == 429
+                        or (status is not None and status >= 500)
+                        or isinstance(
+                            e, (asyncio.TimeoutError, aiohttp.ClientConnectionError, APIConnectionError)
+                        )
+                    )
+                    if not retryable or attempt == LLM_MAX_RETRIES:
+                        limiter.stats["failures"] += 1
+                        raise
+                    limiter.stats["retries"] += 1
+                    # Jitter spreads the retries of concurrent callers; the provider's
+                    # Retry-After is a floor, so it is only ever extended
+                    if retry_after is not None:
+                        delay = retry_after + random.uniform(0, LLM_RETRY_BASE_DELAY)
+                    else:
+                        delay = LLM_RETRY_BASE_DELAY * 2**attempt * random.uniform(0.5, 1.5)
+                    if status == 429:
+                        # Pauses every caller of the provider, including this retry
+                        limiter.on_rate_limited(delay)
+                        continue
+                else:
+                    limiter.record_usage(estimated_tokens, used_tokens)
+                    await limiter.on_success()
+                    return result
+            await asyncio.sleep(delay)
+
+    def metrics(self) -> dict[str, dict[str, float | int]]:
+        """Requests, rate limits, retries and queueing delay per provider and model."""
+        return rate_limiter.metrics()
 
     async def generate_gemini_response(self, prompt: str) -> str:
+        async def request():
+            response = await self.client_gemini.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+            )
+            return response.text, gemini_usage(response)
 
-        response = self.client_gemini.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-        )
-        return response.text
+        return await self.limited("gemini", GEMINI_MODEL, prompt, request)
 
     async def generate_openai_response(
         self,
         prompt: str,
         temperature: float = 1.0,
     ) -> str:
-
-        try:
+        async def request():
             response = await self.client_openai.chat.completions.create(
-                model="gpt-4o",
+                model=OPENAI_MODEL,
                 messages=[{"role": "system", "content": prompt}],
                 stream=False,
             )
-            return response.choices[0].message.content
+            return response.choices[0].message.content, openai_usage(response)
 
-        except Exception as e:
-            print(f"Error in OpenAI call: {e}")
+        return await self.limited("openai", OPENAI_MODEL, prompt, request)
 
     async def generate_azure_response(self, prompt: str, temperature: float = 1.0):
         """Sends a request to Azure OpenAI GPT-4o and returns the response."""
+        payload = {
+            "messages": [{"role": "system", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": 5000,
+        }
 
+        async def request():
+            response_json = await self.post_azure(payload)
+            return (
+                response_json["choices"][0]["message"]["content"],
+                response_json.get("usage", {}).get("total_tokens"),
+            )
+
+        return await self.limited("azure", AZURE_MODEL, prompt, request)
+
+    async def post_azure(self, payload: dict) -> dict:
         headers = {"Content-Type": "application/json", "api-key": self.azure_key}
+        if self.azure_session is None or self.azure_session.closed:
+            self.azure_session = aiohttp.ClientSession()
+        async with self.azure_session.post(
+            self.azure_url, headers=headers, json=payload
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def generate_tool_call(self, llm_type: str, prompt: str, tools: list[dict]) -> dict:
+        """
+        Ask the model to call one of the tools, in a single request.
+
+        Parameters:
+        llm_type (str): One of TOOL_CALLING_LLM_TYPES.
+        tools (list[dict]): Tool definitions in the OpenAI format, with JSON schema parameters.
+
+        Returns:
+        dict: "name" and "parameters" of the called tool, and "output" with any text the model
+        returned. "name" is None if the model answered without calling a tool.
+        """
+        if llm_type == "gemini":
+            return await self.generate_gemini_tool_call(prompt, tools)
+        elif llm_type == "azure":
+            return await self.generate_azure_tool_call(prompt, tools)
+        return await self.generate_openai_tool_call(prompt, tools)
 
+    async def generate_openai_tool_call(self, prompt: str, tools: list[dict]) -> dict:
+        async def request():
+            response = await self.client_openai.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[{"role": "system", "content": prompt}],
+                tools=tools,
+                tool_choice="required",
+                parallel_tool_calls=False,
+                stream=False,
+            )
+            return response, openai_usage(response)
+
+        response = await self.limited("openai", OPENAI_MODEL, prompt + json.dumps(tools), request)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return {"name": None, "parameters": {}, "output": message.content or ""}
+        function = message.tool_calls[0].function
+        return {
+            "name": function.name,
+            "parameters": json.loads(function.arguments or "{}"),
+            "output": message.content or "",
+        }
+
+    async def generate_azure_tool_call(self, prompt: str, tools: list[dict]) -> dict:
         payload = {
             "messages": [{"role": "system", "content": prompt}],
-            "temperature": temperature,
+            "tools": tools,
+            "tool_choice": "required",
             "max_tokens": 5000,
         }
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.azure_url, headers=headers, json=payload
-                ) as response:
+        async def request():
+            response_json = await self.post_azure(payload)
+            return response_json, response_json.get("usage", {}).get("total_tokens")
+
+        response_json = await self.limited("azure", AZURE_MODEL, prompt + json.dumps(tools), request)
+        message = response_json["choices"][0]["message"]
+        tool_calls = message.get("tool_calls") or []
+        if not tool_calls:
+            return {"name": None, "parameters": {}, "output": message.get("content") or ""}
+        function = tool_calls[0]["function"]
+        return {
+            "name": function["name"],
+            "parameters": json.loads(function.get("arguments") or "{}"),
+            "output": message.get("content") or "",
+        }
+
+    async def generate_gemini_tool_call(self, prompt: str, tools: list[dict]) -> dict:
+        declarations = []
+        for tool in tools:
+            function = tool["function"]
+            declaration = {"name": function["name"], "description": function["description"]}
+            # Gemini rejects object schemas without properties
+            if function["parameters"]["properties"]:
+                declaration["parameters"] = to_gemini_schema(function["parameters"])
+            declarations.append(types.FunctionDeclaration(**declaration))
+
+        async def request():
+            response = await self.client_gemini.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    tools=[types.Tool(function_declarations=declarations)],
+                    tool_config=types.ToolConfig(
+                        function_calling_config=types.FunctionCallingConfig(mode="ANY")
+                    ),
+                ),
+            )
+            return response, gemini_usage(response)
+
+        response = await self.limited("gemini", GEMINI_MODEL, prompt + json.dumps(tools), request)
+        if not response.function_calls:
+            return {"name": None, "parameters": {}, "output": response.text or ""}
+        function_call = response.function_calls[0]
+        return {
+            "name": function_call.name,
+            "parameters": dict(function_call.args or {}),
+            "output": "",
+        }
+
+
+def to_gemini_schema(schema: dict) -> dict:
+    """Converts a JSON schema to the OpenAPI subset used by Gemini, with upper case types."""
+    converted = {"type": GEMINI_TYPES.get(schema.get("type", "string"), "STRING")}
+    if "description" in schema:
+        converted["description"] = schema["description"]
+    if "properties" in schema:
+        converted["properties"] = {
+            name: to_gemini_schema(value) for name, value in schema["properties"].items()
+        }
+    if schema.get("required"):
+        converted["required"] = schema["required"]
+    if "items" in schema:
+        converted["items"] = to_gemini_schema(schema["items"])
+    return converted
+
+
+def error_status(e: Exception) -> tuple[int | None, float | None]:
+    """HTTP status of a provider error and its Retry-After seconds, if any."""
+    status = None
+    for attribute in ("status_code", "status", "code"):
+        value = getattr(e, attribute, None)
+        if isinstance(value, int):
+            status = value
+            break
+    headers = getattr(getattr(e, "response", None), "headers", None) or getattr(e, "headers", None)
+    try:
+        retry_after = float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        retry_after = None
+    return status, retry_after
+
+
+def openai_usage(response: Any) -> int | None:
+    return response.usage.total_tokens if response.usage else None
 
-                    response_json = await response.json()
-                    return response_json["choices"][0]["message"]["content"]
 
-        except Exception as e:
-            return f"Error: {str(e)}"
+def gemini_usage(response: Any) -> int | None:
+    usage = response.usage_metadata
+    return usage.total_token_count if usage else None
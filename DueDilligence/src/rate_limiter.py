@@ -0,0 +1,158 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously up to `capacity` units per minute. The level may go
+    negative when actual usage exceeds the estimate; that debt delays later callers.
+    A capacity of 0 means unlimited.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, scale: float) -> None:
+        now = time.monotonic()
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.capacity / 60 * scale
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float, scale: float) -> float:
+        """Seconds until `amount` units are available, at the given fraction of the refill rate."""
+        if not self.capacity:
+            return 0
+        self.refill(scale)
+        # A request larger than the bucket waits for a full bucket
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0) / (self.capacity / 60 * scale)
+
+    def take(self, amount: float) -> None:
+        if self.capacity:
+            self.level -= amount
+
+
+class ProviderLimiter:
+    """
+    Shared limits of one provider and model: requests and tokens per minute, plus a
+    concurrency limit. A rate limited (429) response pauses all callers, halves the
+    request rate and the concurrency, and each success restores them gradually.
+    """
+
+    MIN_SCALE = 0.1
+    RECOVERY = 0.05  # Fraction of the configured rate restored per success
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.scale = 1.0
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.active = 0
+        self.blocked_until = 0.0
+        # FIFO order among waiting callers
+        self.lock = asyncio.Lock()
+        self.condition = asyncio.Condition()
+        self.stats = {
+            "requests": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "failures": 0,
+            "queue_seconds": 0.0,
+            "max_queue_seconds": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int) -> AsyncIterator[None]:
+        """Waits until a request of about `estimated_tokens` fits in the limits, and holds a concurrency slot."""
+        start = time.monotonic()
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.concurrency)
+            self.active += 1
+        try:
+            async with self.lock:
+                while True:
+                    wait = max(
+                        self.blocked_until - time.monotonic(),
+                        self.requests.wait_time(1, self.scale),
+                        self.tokens.wait_time(estimated_tokens, self.scale),
+                    )
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+
+            waited = time.monotonic() - start
+            self.stats["requests"] += 1
+            self.stats["queue_seconds"] += waited
+            self.stats["max_queue_seconds"] = max(self.stats["max_queue_seconds"], waited)
+            yield
+        finally:
+            async with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int | None) -> None:
+        """Corrects the token bucket once the provider reports the actual usage."""
+        if actual_tokens is not None:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    async def on_success(self) -> None:
+        self.scale = min(1.0, self.scale + self.RECOVERY)
+        async with self.condition:
+            if self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self.condition.notify_all()
+
+    def on_rate_limited(self, pause: float) -> None:
+        self.stats["rate_limited"] += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        self.scale = max(self.MIN_SCALE, self.scale / 2)
+        self.concurrency = max(1, self.concurrency // 2)
+
+    def metrics(self) -> dict[str, float | int]:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "avg_queue_seconds": self.stats["queue_seconds"] / requests if requests else 0.0,
+            "rate_scale": round(self.scale, 3),
+            "concurrency": self.concurrency,
+            "active": self.active,
+        }
+
+
+class RateLimiter:
+    """
+    Registry of ProviderLimiters, keyed by provider and model. The limits of a provider
+    come from <PROVIDER>_RPM, <PROVIDER>_TPM (0 for unlimited) and <PROVIDER>_MAX_CONCURRENCY.
+    """
+
+    def __init__(self):
+        self.limiters = dict[tuple[str, str], ProviderLimiter]()
+
+    def get(self, provider: str, model: str) -> ProviderLimiter:
+        key = (provider, model)
+        if key not in self.limiters:
+            prefix = provider.upper()
+            self.limiters[key] = ProviderLimiter(
+                rpm=int(os.getenv(f"{prefix}_RPM", 0)),
+                tpm=int(os.getenv(f"{prefix}_TPM", 0)),
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", 8)),
+            )
+        return self.limiters[key]
+
+    def metrics(self) -> dict[str, dict[str, float | int]]:
+        return {
+            f"{provider}/{model}": limiter.metrics()
+            for (provider, model), limiter in self.limiters.items()
+        }
+
+
+rate_limiter = RateLimiter()
@@ -36,6 +36,26 @@ class RedisStore:
             return None
 
         raw = client.get(key)
+        return cls._decode(raw)
+
+    @classmethod
+    def get_json_many(cls, keys: list[str]) -> dict[str, Any]:
+        """
+        Reads several keys in one MGET round-trip.
+        Returns only the keys that exist, mapped to their decoded values.
+        """
+        if not keys:
+            return {}
+        client = cls.get_client()
+        raw_values = client.mget(keys)
+        return {
+            key: cls._decode(raw)
+            for key, raw in zip(keys, raw_values)
+            if raw is not None
+        }
+
+    @staticmethod
+    def _decode(raw: str) -> Any:
         try:
             data = json.loads(raw)
             while isinstance(data, str):
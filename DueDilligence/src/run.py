@@ -2,7 +2,7 @@ import os
 import sys
 import json
 from datetime import datetime
-import asyncio
+from contextlib import asynccontextmanager
 from typing import Any
 from data_models import DueDiligenceCompanyProfile, DueDiligenceResult
 from data_models import map_company_data_to_profile
@@ -11,25 +11,19 @@ import uvicorn
 from company_data import CompanyData
 from fastapi import FastAPI, HTTPException
 from prompts.prompts2 import Prompts
+from rate_limiter import rate_limiter
 from redisStore import RedisStore
-from thread import TaskThread
-from logger import DDLogger
-from concurrent.futures import ThreadPoolExecutor
+from thread import TaskThread, llm_client
+from logger import DDLogger, logger
+from scheduler import JobScheduler
 
 load_dotenv()
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 MAXIMUM_CALLS_THREAD = int(os.getenv("MAX_CONCURRENT_JOBS", 10))
 
-app = FastAPI()
 prompts = Prompts()
 redis = RedisStore()
-executor = ThreadPoolExecutor(max_workers=MAXIMUM_CALLS_THREAD)
-
-
-def run_dd_process_sync_wrapper(company_name: str):
-    """A synchronous wrapper that runs the async run_dd_process."""
-    asyncio.run(run_dd_process(company_name))
 
 
 async def run_dd_process(company_name: str) -> None:
@@ -62,6 +56,20 @@ async def run_dd_process(company_name: str) -> None:
     redis.set_json(key, dd_result.model_dump_json())
 
 
+scheduler = JobScheduler(run_dd_process, max_concurrent=MAXIMUM_CALLS_THREAD, redis=redis)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    await llm_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
 @app.delete("/redis")
 async def flush_redis() -> dict[str, str]:
     redis.flush_db()
@@ -78,6 +86,8 @@ async def read_redis(company_name:str) -> dict[str, str] | None:
 async def delete_profile(
     company_name: str | None,
 ) -> None:
+    # Stop a queued or running job first, so it does not write the profile again
+    await scheduler.cancel(company_name)
     key = f"generate_profile:{company_name}"
     redis.delete_json(key)
 
@@ -102,8 +112,53 @@ async def get_profile(
     return map_company_data_to_profile(dd_result)
 
 
+@app.post("/profiles")
+async def get_profiles(
+    company_names: list[str],
+) -> dict[str, DueDiligenceCompanyProfile]:
+    keys = {f"generate_profile:{name}": name for name in company_names if name}
+    cached = redis.get_json_many(list(keys))
+    profiles = dict[str, DueDiligenceCompanyProfile]()
+    for key, json_data in cached.items():
+        if not json_data:
+            continue
+        # A malformed entry leaves out its own company, not the whole batch
+        try:
+            profiles[keys[key]] = map_company_data_to_profile(
+                DueDiligenceResult.model_validate(json_data)
+            )
+        except Exception as e:
+            logger.error(f"Invalid due diligence profile for {keys[key]}: {e}")
+    return profiles
+
+
+@app.get("/profile/job")
+async def get_profile_job(company_name: str) -> dict[str, Any]:
+    """Status of the due diligence job of a company: queued, running, done, failed or cancelled."""
+    status = scheduler.get_status(company_name)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"no job for {company_name}")
+    return status
+
+
+@app.get("/jobs")
+async def get_jobs() -> dict[str, int]:
+    """Number of queued and running due diligence jobs."""
+    return scheduler.stats()
+
+
+@app.get("/llm/metrics")
+async def get_llm_metrics() -> dict[str, dict[str, float | int]]:
+    """Requests, rate limits, retries and queueing delay of the LLM calls, per provider and model."""
+    return rate_limiter.metrics()
+
+
 @app.post("/profile")
-async def generate_profile(company_name: str | None) -> dict[str, str]:
+async def generate_profile(company_name: str | None, priority: int = 0) -> dict[str, str]:
+    """
+    Queues a due diligence job. Jobs with a lower priority value run first.
+    A company whose last job failed or was cancelled is queued again.
+    """
     if company_name is None or company_name == "":
         raise HTTPException(
             status_code=400, detail="company_name should be a non-empty string"
@@ -111,7 +166,10 @@ async def generate_profile(company_name: str | None) -> dict[str, str]:
 
     key = f"generate_profile:{company_name}"
     redis_client = redis.get_client()
-    if not redis_client.exists(key):
+    job = scheduler.get_status(company_name)
+    # An unfinished job leaves its partial profile behind, which must not block a retry
+    retry = job is not None and job["status"] in ("failed", "cancelled")
+    if retry or not redis_client.exists(key):
         # Create an initial record with "queued" status and save to Redis
         queued_result = DueDiligenceResult(
             profile={"status": "queued", "metadata": {"task": "Profile generation queued"}},
@@ -121,10 +179,8 @@ async def generate_profile(company_name: str | None) -> dict[str, str]:
         )
         redis.set_json(key, queued_result.model_dump_json())
 
-        # Submit the job to the thread pool
-        loop = asyncio.get_running_loop()
-        loop.run_in_executor(executor, run_dd_process_sync_wrapper, company_name)
-        
+        scheduler.submit(company_name, priority)
+
         return {
             "status": "ok",
             "msg": f"started DueDiligence process for {company_name}",
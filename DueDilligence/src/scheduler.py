@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from logger import logger
+from redisStore import RedisStore
+
+JOB_STATUS_TTL = 7 * 24 * 3600  # Seconds a finished job status is kept
+
+
+class Job:
+    def __init__(self, company_name: str, priority: int):
+        self.company_name = company_name
+        self.priority = priority
+        self.status = "queued"
+        self.task: asyncio.Task | None = None
+        self.queued_at = datetime.now()
+        self.started_at: datetime | None = None
+        self.finished_at: datetime | None = None
+        self.error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "company_name": self.company_name,
+            "priority": self.priority,
+            "status": self.status,
+            "queued_at": self.queued_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
+
+
+class JobScheduler:
+    """
+    Runs due diligence jobs as tasks on the server's event loop, so they share its HTTP
+    sessions, caches and rate limits. Jobs wait in a priority queue (lower priority runs
+    first, then first come first served) and at most `max_concurrent` run at once.
+    Job statuses are written to Redis under "dd_job:<company name>".
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[str], Awaitable[None]],
+        max_concurrent: int,
+        redis: RedisStore = RedisStore(),
+    ):
+        self.run_job = run_job
+        self.max_concurrent = max_concurrent
+        self.redis = redis
+        self.jobs = dict[str, Job]()  # Queued and running jobs
+        self.queue: asyncio.PriorityQueue | None = None
+        self.semaphore: asyncio.Semaphore | None = None
+        self.dispatcher: asyncio.Task | None = None
+        self.counter = itertools.count()
+
+    @staticmethod
+    def key(company_name: str) -> str:
+        return f"dd_job:{company_name}"
+
+    def start(self) -> None:
+        """Starts dispatching jobs; must be called from the running event loop."""
+        self.queue = asyncio.PriorityQueue()
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def stop(self) -> None:
+        """Stops dispatching and cancels the queued and running jobs."""
+        if self.dispatcher:
+            self.dispatcher.cancel()
+            await asyncio.gather(self.dispatcher, return_exceptions=True)
+        for company_name in list(self.jobs):
+            await self.cancel(company_name)
+
+    def submit(self, company_name: str, priority: int = 0) -> bool:
+        """
+        Queues a job for the company.
+
+        Returns:
+        bool: False if a job for the company is already queued or running.
+        """
+        if company_name in self.jobs:
+            return False
+        job = Job(company_name, priority)
+        self.jobs[company_name] = job
+        self.queue.put_nowait((priority, next(self.counter), job))
+        self.save(job)
+        return True
+
+    async def cancel(self, company_name: str) -> bool:
+        """
+        Cancels a queued job, or stops a running one and waits until it has stopped.
+
+        Returns:
+        bool: False if no job for the company is queued or running.
+        """
+        job = self.jobs.pop(company_name, None)
+        if job is None:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        self.finish(job, "cancelled")
+        return True
+
+    def get_status(self, company_name: str) -> dict[str, Any] | None:
+        job = self.jobs.get(company_name)
+        if job is not None:
+            return job.to_dict()
+        return self.redis.get_json(self.key(company_name))
+
+    def stats(self) -> dict[str, int]:
+        running = sum(1 for job in self.jobs.values() if job.status == "running")
+        return {
+            "queued": len(self.jobs) - running,
+            "running": running,
+            "max_concurrent": self.max_concurrent,
+        }
+
+    def save(self, job: Job, **redis_kwargs) -> None:
+        self.redis.set_json(self.key(job.company_name), job.to_dict(), **redis_kwargs)
+
+    def finish(self, job: Job, status: str, error: str | None = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now()
+        self.save(job, ex=JOB_STATUS_TTL)
+
+    async def dispatch(self) -> None:
+        while True:
+            await self.semaphore.acquire()
+            _, _, job = await self.queue.get()
+            # Skip the queue entries of cancelled jobs
+            if self.jobs.get(job.company_name) is not job:
+                self.semaphore.release()
+                continue
+            job.status = "running"
+            job.started_at = datetime.now()
+            self.save(job)
+            job.task = asyncio.create_task(self.run(job))
+
+    async def run(self, job: Job) -> None:
+        try:
+            await self.run_job(job.company_name)
+        except asyncio.CancelledError:
+            # cancel() records the cancellation
+            raise
+        except Exception as e:
+            logger.error(f"Due diligence job for {job.company_name} failed: {e}")
+            if self.jobs.pop(job.company_name, None) is job:
+                self.finish(job, "failed", str(e))
+        else:
+            if self.jobs.pop(job.company_name, None) is job:
+                self.finish(job, "done")
+        finally:
+            self.semaphore.release()
@@ -1,25 +1,39 @@
+import asyncio
 import inspect
 import json
 import os
 import re
+import time
 import traceback
 from textwrap import dedent
 from typing import Any, Callable
 
-import tiktoken
 from browse_tools import extract_text_from_url, search_google
 from company_data import CompanyData
 from dotenv import load_dotenv
 from fastapi import FastAPI
-from llm_client import LLMClient
+from llm_client import TOOL_CALLING_LLM_TYPES, LLMClient
 from logger import Logger, logger
 from prompts.prompts2 import Prompts
+from token_buffer import TokenBuffer
 
 load_dotenv()
 LLM_TYPE = os.getenv("LLM_TYPE")
 CONTEXT_LIMIT = int(os.getenv("CONTEXT_LIMIT", 1000))
 MAXIMUM_CALLS_AGENT = int(os.getenv("MAXIMUM_CALLS_AGENT", 8))
 MAXIMUM_CALLS_THREAD = int(os.getenv("MAX_CONCURRENT_THREAD", 15))
+# Run the worker agents of a round concurrently instead of one after another
+CONCURRENT_AGENTS = os.getenv("CONCURRENT_AGENTS", "false").lower() == "true"
+# Pick the next function with the provider's tool calling API, in one LLM call per step
+NATIVE_TOOL_CALLS = os.getenv("NATIVE_TOOL_CALLS", "true").lower() == "true"
+JSON_SCHEMA_TYPES = {
+    "str": "string",
+    "int": "integer",
+    "float": "number",
+    "bool": "boolean",
+    "dict": "object",
+    "list": "array",
+}
 
 app = FastAPI()
 llm_client = LLMClient()
@@ -35,6 +49,14 @@ async def call_llm(prompt: str) -> str:
         return await llm_client.generate_openai_response(prompt)
 
 
+async def call_llm_with_tools(prompt: str, tools: list[dict]) -> dict:
+    return await llm_client.generate_tool_call(LLM_TYPE or "openai", prompt, tools)
+
+
+def supports_tool_calls() -> bool:
+    return NATIVE_TOOL_CALLS and (LLM_TYPE or "openai") in TOOL_CALLING_LLM_TYPES
+
+
 def maybe_remove_json_code_block_markers(input_string: str) -> str:
     if input_string.startswith("```json"):
         input_string = input_string.removeprefix("```json")
@@ -46,13 +68,6 @@ def maybe_remove_json_code_block_markers(input_string: str) -> str:
     return input_string
 
 
-def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
-    """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
-
-
 async def create_final_report(data: dict[str, str]) -> str:
     prompt = f"""
                     Prepare company profile report. This are final data about the company:
@@ -101,7 +116,7 @@ class FunctionalAgent:
             f"You are a {name}. You can call any of the following functions."
         )
         self.logger = logger
-        self.buffer = list[str]()
+        self.buffer = TokenBuffer()
         self.register(self.response)
         if functions:
             for func in functions:
@@ -115,18 +130,24 @@ class FunctionalAgent:
 
     def clear_buffer(self) -> None:
         """Clears the agent's buffer."""
-        self.buffer = list[str]()
+        self.buffer.clear()
 
     def register(self, func: Callable[..., Any]) -> None:
         if func.__name__ in self.registry:
             raise ValueError("Function already registered")
+        parameters = inspect.signature(func).parameters
         function_params = {
             param_name: param.annotation.__name__
-            for param_name, param in inspect.signature(func).parameters.items()
+            for param_name, param in parameters.items()
         }
         self.registry[func.__name__] = {
             "description": func.__doc__,
             "params": function_params,
+            "required": [
+                param_name
+                for param_name, param in parameters.items()
+                if param.default is inspect.Parameter.empty
+            ],
             "function": func,  # Store the function itself
         }
 
@@ -177,6 +198,27 @@ class FunctionalAgent:
         ]
         return f"{json.dumps(functions_list)}"
 
+    def generate_tool_definitions(self) -> list[dict]:
+        """Generates tool definitions with JSON schema parameters for the provider's tool calling API."""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": inspect.cleandoc(info["description"] or name),
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            param_name: {"type": JSON_SCHEMA_TYPES.get(param_type, "string")}
+                            for param_name, param_type in info["params"].items()
+                        },
+                        "required": info["required"],
+                    },
+                },
+            }
+            for name, info in self.registry.items()
+        ]
+
     def output_format(self):
         example_output = {
             "name": "function_name",
@@ -193,36 +235,48 @@ class FunctionalAgent:
         return f"Output should have a valid JSON object without any wrappers in the following format:\n{str}"
 
     async def reduce_buffer(self) -> str:
-        if len(self.buffer) > 0:
-            for _ in range(6): # hard stop on summarization
-                if num_tokens_from_string("\n".join(self.buffer)) <= CONTEXT_LIMIT:
-                    break
-                summary = await summarize_with_intent(self.buffer, "shorten")
-                self.buffer = [summary]
-        return "\n".join(self.buffer)
+        return await self.buffer.reduce(
+            CONTEXT_LIMIT, lambda texts: summarize_with_intent(texts, "shorten")
+        )
 
-    async def run(self, input_string: str = "") -> str:
-        """Process the input string, call LLM, parse output, and execute function until the final function is called."""
-        output = ""
-        buffer_str = ""
-        functions_definitions = self.generate_functions_for_prompt()
-        calls_made = list[str]()
-        for _ in range(self.maximum_calls):
-            try:
-                buffer_str = await self.reduce_buffer()
-                prompt = f"""\
-                {self.get_system_prompt()}
-                ----------------
+    def step_prompt(
+        self,
+        input_string: str,
+        buffer_str: str,
+        functions_definitions: str,
+        num_calls: int,
+        native: bool,
+    ) -> str:
+        """Prompt of a step of run. With native tool calls the functions are passed to the API instead."""
+        functions_part = (
+            ""
+            if native
+            else f"""\
                 You can use the following functions as tools and nothing else. 
                 <Functions>
                 {functions_definitions}
                 </Functions>
+                ----------------"""
+        )
+        output_part = (
+            "Call exactly one of the functions."
+            if native
+            else f"""\
+                Using the function definitions, provide the function name and parameters in a valid JSON format.
+                {self.output_format()}
+                Remember, the output must be a valid JSON format.
                 ----------------
+                OUTPUT:"""
+        )
+        prompt = f"""\
+                {self.get_system_prompt()}
+                ----------------
+                {functions_part}
                 Take a deep break and think step by step.
                 Make sure to not call the same function with the same parameters more than once.
                 When trying to call a function, check what information is already available in the <FunctionCallHistory/>
                 At each step evaluate if you have all the information that you need and consider finishing the task. 
-                You have so far made {len(calls_made)} out of {self.maximum_calls} available.
+                You have so far made {num_calls} out of {self.maximum_calls} available.
                 Call response function when you are satisfied with the output and share the satified output to response function as message.
                 If you deduce that there is nothing to do on you end, call the reponse function and explain why you believe so.
                 ----------------
@@ -234,19 +288,64 @@ class FunctionalAgent:
                 {input_string}
                 </CurrentInputAndHistory>
                 ----------------
-                Using the function definitions, provide the function name and parameters in a valid JSON format.
-                {self.output_format()}
-                Remember, the output must be a valid JSON format.
-                ----------------
-                OUTPUT:
+                {output_part}
                 """
-                prompt = re.sub(r"^\s+", "", prompt, flags=re.MULTILINE).strip()
-                prompt = dedent(prompt).strip()
-                # print(f"\n\n\n\n\n{prompt}\n\n\n\n\n")
-                ai_output_raw = await call_llm(prompt)
+        prompt = re.sub(r"^\s+", "", prompt, flags=re.MULTILINE).strip()
+        return dedent(prompt).strip()
 
+    async def next_function_call(
+        self, input_string: str, buffer_str: str, functions_definitions: str, num_calls: int
+    ) -> str:
+        """
+        Decides the next function to call, as a JSON string with name, output, reasoning and parameters.
+        Providers with tool calling pick the function in a single call. Otherwise, or if that
+        fails, the LLM describes the call in free text and a second call maps it onto the registry.
+        """
+        ai_output_raw = ""
+        if supports_tool_calls():
+            try:
+                tool_call = await call_llm_with_tools(
+                    self.step_prompt(input_string, buffer_str, functions_definitions, num_calls, native=True),
+                    self.generate_tool_definitions(),
+                )
+                if tool_call["name"] is not None:
+                    parameters = tool_call["parameters"]
+                    output = tool_call["output"]
+                    if tool_call["name"] == "response":
+                        # run returns the output of the response function as the agent's answer
+                        output = parameters.get("message", output)
+                    return json.dumps(
+                        {
+                            "name": tool_call["name"],
+                            "output": output,
+                            "reasoning": "",
+                            "parameters": parameters,
+                        }
+                    )
+                # Answered in text: map it onto the registry below
+                ai_output_raw = tool_call["output"]
+            except Exception as e:
+                logger.error(f"Tool call failed, falling back to function mapping: {e}")
+
+        if not ai_output_raw:
+            ai_output_raw = await call_llm(
+                self.step_prompt(input_string, buffer_str, functions_definitions, num_calls, native=False)
+            )
+        return await self.map_function_call(ai_output_raw, functions_definitions)
+
+    async def run(self, input_string: str = "") -> str:
+        """Process the input string, call LLM, parse output, and execute function until the final function is called."""
+        output = ""
+        buffer_str = ""
+        functions_definitions = self.generate_functions_for_prompt()
+        calls_made = list[str]()
+        for _ in range(self.maximum_calls):
+            try:
+                buffer_str = await self.reduce_buffer()
                 ai_output = maybe_remove_json_code_block_markers(
-                    await self.map_function_call(ai_output_raw, functions_definitions)
+                    await self.next_function_call(
+                        input_string, buffer_str, functions_definitions, len(calls_made)
+                    )
                 )
 
                 try:
@@ -387,11 +486,13 @@ class TaskThread:
         task: str = "",
         channel: str = "",
         company_data: CompanyData = CompanyData(),
+        concurrent_agents: bool = CONCURRENT_AGENTS,
     ):
         self.task = task
         self.is_finished = False
         self.channel = channel
-        self.buffer = []
+        # Sized in characters, unlike the token sized agent buffers
+        self.buffer = TokenBuffer(count=len)
         self.agents = dict[str, FunctionalAgent]()
         self.result = dict[str, Any]({"Report": "No Result"})
         self.task_manager_name = ""
@@ -399,6 +500,8 @@ class TaskThread:
         self.logger = logger
         self.max_calls_agent = MAXIMUM_CALLS_AGENT
         self.max_calls_thred = MAXIMUM_CALLS_THREAD
+        self.concurrent_agents = concurrent_agents
+        self.round_metrics = list[dict[str, Any]]()
 
         task_manager = FunctionalAgent(
             name="Ethan Pierce (Product Manager)",
@@ -576,18 +679,99 @@ class TaskThread:
         return self.result
 
     def get_buffer_str_raw(self):
-        return "\n".join(self.buffer)
+        return self.buffer.text()
 
     async def get_buffer_str(self):
-        for _ in range(6): # Hard stop on summarization
-            if len(self.get_buffer_str_raw()) <= CONTEXT_LIMIT:
-                break
-            summary = await summarize_with_intent(
-                self.buffer,
+        return await self.buffer.reduce(
+            CONTEXT_LIMIT,
+            lambda texts: summarize_with_intent(
+                texts,
                 f"shorten keeping information about task: {self.task}",
+            ),
+        )
+
+    def buffer_metrics(self) -> dict[str, dict[str, int]]:
+        """Size of the conversation buffer and of the buffer of each agent."""
+        metrics = {"Conversation": self.buffer.metrics()}
+        for agent_name, agent in self.agents.items():
+            metrics[agent_name] = agent.buffer.metrics()
+        return metrics
+
+    def get_agent_input(self, buffer_str: str) -> str:
+        conversation_part = (
+            f"\n\n<Conversation>\n{buffer_str}\n</Conversation>\n"
+            if buffer_str
+            else "\n"
+        )
+        return dedent(
+            f"""\
+        You are working on the following task:
+        <Task>{self.task}</Task>
+        You are in a conversation with the following colleagues:
+        {self.get_agent_names()}
+        If you are not sure about your response, ask for feedback.                
+        {conversation_part}                
+        """
+        )
+
+    def add_agent_message(self, agent_name: str, agent_response: str) -> None:
+        if agent_response and len(agent_response) > 0:
+            self.buffer.append(
+                f"""
+                    <AgentMessage>
+                        <AgentName>{agent_name}</AgentName>
+                        <AgentMessageContent>{agent_response}</AgentMessageContent>
+                    </AgentMessage>"""
             )
-            self.buffer = [summary]
-        return self.get_buffer_str_raw()
+            log_data = {
+                "agent name": agent_name,
+                "agent response": agent_response,
+            }
+
+            self.logger.add_log(json.dumps(log_data))
+            self.logger.update_profile(self.result)
+
+    async def run_workers_concurrently(self) -> dict[str, float]:
+        """
+        Run every agent except the task manager at once, all on the same snapshot of the
+        conversation. Their messages are appended in the order the agents were registered,
+        so the conversation does not depend on which agent finishes first.
+        Returns the wall-clock seconds of each agent.
+        """
+        agent_input = self.get_agent_input(await self.get_buffer_str())
+        workers = [
+            (agent_name, agent)
+            for agent_name, agent in self.agents.items()
+            if agent_name != self.task_manager_name
+        ]
+
+        async def run_worker(agent: FunctionalAgent) -> tuple[str, float]:
+            start = time.perf_counter()
+            try:
+                return await agent.run(input_string=agent_input), time.perf_counter() - start
+            except Exception as e:
+                logger.error(f"{agent.name} failed: {e}")
+                return "", time.perf_counter() - start
+
+        results = await asyncio.gather(*(run_worker(agent) for _, agent in workers))
+
+        agent_seconds = dict[str, float]()
+        for (agent_name, _), (agent_response, seconds) in zip(workers, results):
+            agent_seconds[agent_name] = seconds
+            self.add_agent_message(agent_name, agent_response)
+        return agent_seconds
+
+    def record_round(self, cycle: int, seconds: float, agent_seconds: dict[str, float]) -> None:
+        """Store and log the wall-clock seconds of a round and of each agent in it, and the buffer sizes."""
+        metrics = {
+            "round": cycle + 1,
+            "mode": "concurrent" if self.concurrent_agents else "sequential",
+            "seconds": round(seconds, 3),
+            "agents": {name: round(value, 3) for name, value in agent_seconds.items()},
+            "buffers": self.buffer_metrics(),
+        }
+        self.round_metrics.append(metrics)
+        logger.info(f"Round metrics: {json.dumps(metrics)}")
 
     async def run(self) -> str:
         
@@ -598,7 +782,7 @@ class TaskThread:
             for agent in self.agents.values():
                 agent.clear_buffer()
 
-            self.buffer = list[str]()
+            self.buffer.clear()
             self.is_finished = False
             self.logger.update_profile(self.result)
 
@@ -606,45 +790,23 @@ class TaskThread:
                 if self.is_finished:
                     break
 
-                for agent_name, agent in self.agents.items():
+                round_start = time.perf_counter()
+                if self.concurrent_agents:
+                    agent_seconds = await self.run_workers_concurrently()
+                    agents = [(self.task_manager_name, self.agents[self.task_manager_name])]
+                else:
+                    agent_seconds = dict[str, float]()
+                    agents = list(self.agents.items())
+
+                for agent_name, agent in agents:
                     if self.is_finished:
                         break
 
-                    buffer_str = await self.get_buffer_str()
-                    # Calculate the conversation part first
-                    conversation_part = (
-                        f"\n\n<Conversation>\n{buffer_str}\n</Conversation>\n"
-                        if buffer_str
-                        else "\n"
-                    )
-
-                    # Now construct the agent_input as a multiline string
-                    agent_input = dedent(
-                        f"""\
-                    You are working on the following task:
-                    <Task>{self.task}</Task>
-                    You are in a conversation with the following colleagues:
-                    {self.get_agent_names()}
-                    If you are not sure about your response, ask for feedback.                
-                    {conversation_part}                
-                    """
-                    )
+                    agent_input = self.get_agent_input(await self.get_buffer_str())
+                    agent_start = time.perf_counter()
                     agent_response = await agent.run(input_string=agent_input)
-                    if agent_response and len(agent_response) > 0:
-                        self.buffer.append(
-                            f"""
-                                <AgentMessage>
-                                    <AgentName>{agent_name}</AgentName>
-                                    <AgentMessageContent>{agent_response}</AgentMessageContent>
-                                </AgentMessage>"""
-                        )
-                        log_data = {
-                            "agent name": agent_name,
-                            "agent response": agent_response,
-                        }
-
-                        self.logger.add_log(json.dumps(log_data))
-                        self.logger.update_profile(self.result)
+                    agent_seconds[agent_name] = time.perf_counter() - agent_start
+                    self.add_agent_message(agent_name, agent_response)
 
                 buffer_str = await self.get_buffer_str()
 
@@ -667,6 +829,7 @@ class TaskThread:
                 """
                 )
                 await self.agents.get(self.task_manager_name).run(input_string=agent_input)
+                self.record_round(i, time.perf_counter() - round_start, agent_seconds)
 
                 logger.info(
                     f"Made {i + 1} cycles so far (out of max {MAXIMUM_CALLS_AGENT})"
@@ -6,7 +6,6 @@ import traceback
 from textwrap import dedent
 from typing import Any, Callable
 
-import tiktoken
 from browse_tools import extract_text_from_url, search_google
 from person_data import PersonData
 from dotenv import load_dotenv
@@ -14,6 +13,7 @@ from fastapi import FastAPI
 from llm_client import LLMClient
 from logger import Logger, logger
 from prompts.prompts3 import Prompts
+from token_buffer import num_tokens_from_string
 
 # import uvicorn
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -53,13 +53,6 @@ def maybe_remove_json_code_block_markers(input_string: str) -> str:
     return input_string
 
 
-def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
-    """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
-
-
 async def create_final_report(data: dict[str, str]) -> str:
     prompt = f"""
                     Prepare company profile report. This are final data about the company:
@@ -0,0 +1,102 @@
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterator
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base") -> tiktoken.Encoding:
+    """Loads a tiktoken encoding once per process."""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def num_tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
+    """Returns the number of tokens in a text string."""
+    return len(get_encoding(encoding_name).encode(string))
+
+
+class TokenBuffer:
+    """
+    Message buffer that keeps the size of every message and a running total, so
+    checking it against a budget does not re-measure the whole buffer.
+
+    Parameters:
+    count (Callable[[str], int]): Measures the size of a message, in tokens by default.
+    separator (str): Joins the messages into the buffer text.
+    """
+
+    def __init__(
+        self,
+        count: Callable[[str], int] = num_tokens_from_string,
+        separator: str = "\n",
+    ):
+        self.count = count
+        self.separator = separator
+        self.messages = list[str]()
+        self.sizes = list[int]()
+        self.size = 0
+        self.summaries = 0
+        self._text: str | None = None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.messages)
+
+    def append(self, message: str) -> None:
+        size = self.count(message)
+        self.messages.append(message)
+        self.sizes.append(size)
+        self.size += size
+        self._text = None
+
+    def clear(self) -> None:
+        self.messages = list[str]()
+        self.sizes = list[int]()
+        self.size = 0
+        self._text = None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.separator.join(self.messages)
+        return self._text
+
+    async def reduce(
+        self,
+        limit: int,
+        summarize: Callable[[list[str]], Awaitable[str]],
+        max_rounds: int = 6,
+    ) -> str:
+        """
+        Summarizes the oldest messages until the buffer fits in the limit, keeping the recent ones verbatim.
+        Each round replaces the oldest segment, at least half of the buffer and twice the excess,
+        with its summary. Stops after max_rounds summaries.
+
+        Returns:
+        str: The buffer text.
+        """
+        for _ in range(max_rounds):
+            if self.size <= limit or not self.messages:
+                break
+            target = max(2 * (self.size - limit), self.size // 2)
+            end, segment_size = 0, 0
+            while end < len(self.messages) and segment_size < target:
+                segment_size += self.sizes[end]
+                end += 1
+            summary = await summarize(self.messages[:end])
+            summary_size = self.count(summary)
+            self.messages[:end] = [summary]
+            self.sizes[:end] = [summary_size]
+            self.size += summary_size - segment_size
+            self.summaries += 1
+            self._text = None
+        return self.text()
+
+    def metrics(self) -> dict[str, int]:
+        """Returns the number of messages, their total size and how many summaries were made."""
+        return {
+            "messages": len(self.messages),
+            "size": self.size,
+            "summaries": self.summaries,
+        }
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from urllib.parse import quote
 
@@ -15,7 +16,10 @@ async def summarize_text(text: str) -> str:
 
 
 async def google_search(query: str, pages: int) -> list[dict[str, str]]:
-    search_results = search(query, advanced=True, num_results=pages)
+    # googlesearch is blocking, keep it off the event loop shared by all jobs
+    search_results = await asyncio.to_thread(
+        lambda: list(search(query, advanced=True, num_results=pages))
+    )
     final_results = list[str]()
     for search_result in search_results:
         assert hasattr(search_result, "url")
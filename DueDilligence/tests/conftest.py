@@ -0,0 +1,34 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# The service modules import each other by their flat names, as in the Docker image
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+
+class FakeClock:
+    """Monotonic clock that only moves when asyncio.sleep is awaited."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = list[float]()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 0)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    import rate_limiter
+
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+    return clock
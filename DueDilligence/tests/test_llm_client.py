@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+import llm_client
+from llm_client import LLMClient
+from rate_limiter import RateLimiter
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int, retry_after: str | None = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.headers = {"retry-after": retry_after} if retry_after else {}
+
+
+@pytest.fixture
+def client(monkeypatch, clock) -> LLMClient:
+    monkeypatch.setattr(llm_client, "rate_limiter", RateLimiter())
+    monkeypatch.setattr(llm_client, "num_tokens_from_string", len)
+    monkeypatch.setattr(llm_client, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(llm_client, "LLM_RETRY_BASE_DELAY", 1.0)
+    # limited() needs none of the provider clients
+    return LLMClient.__new__(LLMClient)
+
+
+def failing(*errors: Exception):
+    remaining = list(errors)
+
+    async def request():
+        if remaining:
+            raise remaining.pop(0)
+        return "ok", 10
+
+    return request
+
+
+def test_server_errors_are_retried_with_jitter(client, clock, monkeypatch):
+    jitter = []
+    monkeypatch.setattr(
+        llm_client.random, "uniform", lambda low, high: jitter.append((low, high)) or high
+    )
+
+    result = asyncio.run(
+        client.limited("openai", "gpt-4o", "prompt", failing(ProviderError(500), ProviderError(503)))
+    )
+
+    assert result == "ok"
+    assert jitter == [(0.5, 1.5)] * 2
+    # Exponential backoff, scaled by the jitter
+    assert clock.sleeps == [1.5, 3.0]
+    assert llm_client.rate_limiter.metrics()["openai/gpt-4o"]["retries"] == 2
+
+
+def test_rate_limited_request_pauses_the_provider(client, clock, monkeypatch):
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: low)
+
+    result = asyncio.run(
+        client.limited("openai", "gpt-4o", "prompt", failing(ProviderError(429)))
+    )
+
+    limiter = llm_client.rate_limiter.get("openai", "gpt-4o")
+    assert result == "ok"
+    # Without Retry-After the jittered backoff pauses every caller through the limiter
+    assert clock.sleeps == [0.5]
+    assert limiter.stats["rate_limited"] == 1
+    assert limiter.scale == 0.5 + limiter.RECOVERY
+
+
+@pytest.mark.parametrize("jitter", [0.0, 0.5, 1.0])
+def test_retry_after_is_a_floor(client, clock, monkeypatch, jitter):
+    bounds = []
+
+    def uniform(low: float, high: float) -> float:
+        bounds.append((low, high))
+        return low + jitter * (high - low)
+
+    monkeypatch.setattr(llm_client.random, "uniform", uniform)
+
+    asyncio.run(client.limited("openai", "gpt-4o", "prompt", failing(ProviderError(429, "7"))))
+
+    # Jitter only extends the pause the provider asked for
+    assert bounds == [(0, 1.0)]
+    assert clock.sleeps == [7 + jitter]
+
+
+def test_client_errors_are_not_retried(client, clock):
+    with pytest.raises(ProviderError):
+        asyncio.run(client.limited("openai", "gpt-4o", "prompt", failing(ProviderError(400))))
+
+    assert clock.sleeps == []
+    assert llm_client.rate_limiter.metrics()["openai/gpt-4o"]["failures"] == 1
+
+
+def test_retries_give_up_after_max_retries(client, clock, monkeypatch):
+    monkeypatch.setattr(llm_client.random, "uniform", lambda low, high: 1.0)
+    errors = [ProviderError(500) for _ in range(3)]
+
+    with pytest.raises(ProviderError):
+        asyncio.run(client.limited("openai", "gpt-4o", "prompt", failing(*errors)))
+
+    assert clock.sleeps == [1.0, 2.0]
+    assert llm_client.rate_limiter.metrics()["openai/gpt-4o"]["failures"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import ProviderLimiter, RateLimiter, TokenBucket
+
+
+def test_bucket_refills_over_time(clock):
+    bucket = TokenBucket(60)  # One unit per second
+    bucket.take(60)
+
+    clock.now = 30
+    assert bucket.wait_time(1, 1.0) == 0
+    assert bucket.level == 30
+    assert bucket.wait_time(60, 1.0) == 30
+    # At half the rate the missing units take twice as long
+    assert bucket.wait_time(60, 0.5) == 60
+
+
+def test_bucket_never_refills_past_capacity(clock):
+    bucket = TokenBucket(60)
+
+    clock.now = 600
+    bucket.refill(1.0)
+
+    assert bucket.level == 60
+
+
+def test_request_larger_than_bucket_waits_for_full_bucket(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+
+    assert bucket.wait_time(100, 1.0) == 60
+
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket(0)
+    bucket.take(1000)
+
+    assert bucket.wait_time(10**6, 1.0) == 0
+
+
+def test_slot_waits_for_request_rate(clock):
+    limiter = ProviderLimiter(rpm=1, tpm=0, max_concurrency=4)
+
+    async def run():
+        for _ in range(2):
+            async with limiter.slot(100):
+                pass
+
+    asyncio.run(run())
+
+    assert clock.sleeps == [60]
+    assert limiter.metrics()["requests"] == 2
+    assert limiter.metrics()["max_queue_seconds"] == 60
+
+
+def test_record_usage_corrects_token_estimate(clock):
+    limiter = ProviderLimiter(rpm=0, tpm=1000, max_concurrency=4)
+
+    async def run():
+        async with limiter.slot(100):
+            pass
+        limiter.record_usage(100, 700)
+        # 700 of 1000 tokens are used, so 500 more wait until 200 are refilled
+        async with limiter.slot(500):
+            pass
+
+    asyncio.run(run())
+
+    assert clock.sleeps == [pytest.approx(12)]
+
+
+def test_rate_limited_pauses_and_recovers(clock):
+    limiter = ProviderLimiter(rpm=0, tpm=0, max_concurrency=8)
+    limiter.on_rate_limited(10)
+
+    assert (limiter.scale, limiter.concurrency) == (0.5, 4)
+
+    async def run():
+        async with limiter.slot(100):
+            pass
+        await limiter.on_success()
+
+    asyncio.run(run())
+
+    assert clock.sleeps == [10]
+    assert limiter.scale == 0.5 + ProviderLimiter.RECOVERY
+    assert limiter.concurrency == 5
+    assert limiter.metrics()["rate_limited"] == 1
+
+
+def test_rate_limiter_reads_provider_limits(monkeypatch):
+    monkeypatch.setenv("AZURE_RPM", "120")
+    monkeypatch.setenv("AZURE_MAX_CONCURRENCY", "2")
+    limiters = RateLimiter()
+
+    limiter = limiters.get("azure", "gpt-4o")
+
+    assert limiters.get("azure", "gpt-4o") is limiter
+    assert (limiter.requests.capacity, limiter.tokens.capacity) == (120, 0)
+    assert limiter.max_concurrency == 2
+    assert list(limiters.metrics()) == ["azure/gpt-4o"]
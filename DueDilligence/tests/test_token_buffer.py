@@ -0,0 +1,72 @@
+import asyncio
+
+from token_buffer import TokenBuffer
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def make_buffer(messages: int = 10, words: int = 10) -> TokenBuffer:
+    buffer = TokenBuffer(count=count_words)
+    for i in range(messages):
+        buffer.append(" ".join([f"m{i}"] * words))
+    return buffer
+
+
+def test_append_tracks_sizes():
+    buffer = make_buffer(messages=3, words=4)
+
+    assert buffer.sizes == [4, 4, 4]
+    assert buffer.size == 12
+    assert buffer.text() == "\n".join(buffer.messages)
+
+    buffer.clear()
+    assert (len(buffer), buffer.size, buffer.text()) == (0, 0, "")
+
+
+def test_reduce_within_limit_does_not_summarize():
+    buffer = make_buffer()
+    calls = []
+
+    async def summarize(messages: list[str]) -> str:
+        calls.append(messages)
+        return "summary"
+
+    text = asyncio.run(buffer.reduce(100, summarize))
+
+    assert calls == []
+    assert text == "\n".join(buffer.messages)
+
+
+def test_reduce_summarizes_oldest_messages():
+    buffer = make_buffer()
+    recent = buffer.messages[5:]
+    calls = []
+
+    async def summarize(messages: list[str]) -> str:
+        calls.append(messages)
+        return "short summary text"
+
+    # 20 over the limit: at least half of the buffer is summarized
+    text = asyncio.run(buffer.reduce(80, summarize))
+
+    assert [len(messages) for messages in calls] == [5]
+    assert buffer.messages == ["short summary text"] + recent
+    assert buffer.sizes == [3] + [10] * 5
+    assert buffer.size == 53
+    assert buffer.metrics() == {"messages": 6, "size": 53, "summaries": 1}
+    assert text == "\n".join(buffer.messages)
+
+
+def test_reduce_stops_after_max_rounds():
+    buffer = make_buffer()
+
+    async def summarize(messages: list[str]) -> str:
+        # Never shorter than the limit
+        return " ".join(["word"] * 60)
+
+    asyncio.run(buffer.reduce(50, summarize, max_rounds=2))
+
+    assert buffer.summaries == 2
+    assert buffer.size == sum(buffer.sizes) > 50
@@ -0,0 +1,102 @@
+-- Search index for the free-text company query.
+-- Runs after 00-init.sql on a fresh database. For an existing database apply it manually:
+--   psql -h <host> -U <user> -d <db> -f backend/database/01-company-search.sql
+-- Adding the generated column computes it for all existing rows, and the
+-- statements are idempotent, so running the script twice is safe.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Weighted full-text document: names rank above portfolio terms, which rank above free text.
+CREATE OR REPLACE FUNCTION companies_search_vector(
+    name VARCHAR,
+    website VARCHAR,
+    industry VARCHAR,
+    subindustries VARCHAR[],
+    products_portfolio TEXT[],
+    service_portfolio TEXT[],
+    specific_tools_and_technologies TEXT[],
+    specializations TEXT[],
+    quality_standards TEXT[],
+    country VARCHAR,
+    company_size VARCHAR,
+    company_profile TEXT,
+    description TEXT,
+    contact_information JSONB
+) RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT
+        setweight(to_tsvector('simple'::regconfig, coalesce(name, '') || ' ' || coalesce(website, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig,
+            coalesce(industry, '') || ' ' ||
+            coalesce(array_to_string(subindustries, ' '), '') || ' ' ||
+            coalesce(array_to_string(products_portfolio, ' '), '') || ' ' ||
+            coalesce(array_to_string(service_portfolio, ' '), '') || ' ' ||
+            coalesce(array_to_string(specific_tools_and_technologies, ' '), '') || ' ' ||
+            coalesce(array_to_string(specializations, ' '), '')
+        ), 'B') ||
+        setweight(to_tsvector('simple'::regconfig,
+            coalesce(array_to_string(quality_standards, ' '), '') || ' ' ||
+            coalesce(country, '') || ' ' ||
+            coalesce(company_size, '') || ' ' ||
+            coalesce(company_profile, '') || ' ' ||
+            coalesce(description, '')
+        ), 'C') ||
+        setweight(jsonb_to_tsvector('simple'::regconfig, coalesce(contact_information, '{}'::jsonb), '["string"]'), 'D')
+$$;
+
+-- Lower-cased concatenation of every searchable field, used for substring (trigram) matches.
+CREATE OR REPLACE FUNCTION companies_search_text(
+    name VARCHAR,
+    website VARCHAR,
+    status VARCHAR,
+    due_diligence_status VARCHAR,
+    risk_level INTEGER,
+    country VARCHAR,
+    industry VARCHAR,
+    subindustries VARCHAR[],
+    products_portfolio TEXT[],
+    service_portfolio TEXT[],
+    specific_tools_and_technologies TEXT[],
+    specializations TEXT[],
+    quality_standards TEXT[],
+    company_size VARCHAR,
+    company_profile TEXT,
+    description TEXT,
+    verdict VARCHAR,
+    contact_information JSONB
+) RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT LOWER(concat_ws(' ',
+        name, website, status, due_diligence_status, risk_level::TEXT, country, industry,
+        array_to_string(subindustries, ' '),
+        array_to_string(products_portfolio, ' '),
+        array_to_string(service_portfolio, ' '),
+        array_to_string(specific_tools_and_technologies, ' '),
+        array_to_string(specializations, ' '),
+        array_to_string(quality_standards, ' '),
+        company_size, company_profile, description, verdict,
+        (SELECT string_agg(value, ' ') FROM jsonb_each_text(contact_information))
+    ))
+$$;
+
+ALTER TABLE companies ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (companies_search_vector(
+        name, website, industry, subindustries, products_portfolio, service_portfolio,
+        specific_tools_and_technologies, specializations, quality_standards, country,
+        company_size, company_profile, description, contact_information
+    )) STORED;
+
+CREATE INDEX IF NOT EXISTS companies_search_vector_idx ON companies USING GIN (search_vector);
+
+-- Expression index rather than a stored column, so SELECT * rows do not carry a second copy of the text.
+-- Queries must use the exact same expression to hit it.
+CREATE INDEX IF NOT EXISTS companies_search_text_trgm_idx ON companies USING GIN (
+    companies_search_text(
+        name, website, status, due_diligence_status, risk_level, country, industry,
+        subindustries, products_portfolio, service_portfolio, specific_tools_and_technologies,
+        specializations, quality_standards, company_size, company_profile, description,
+        verdict, contact_information
+    ) gin_trgm_ops
+);
+
+ANALYZE companies;
@@ -0,0 +1,29 @@
+-- Completion notifications for crawled sites.
+-- Runs after 01-company-search.sql on a fresh database. For an existing database apply it manually:
+--   psql -h <host> -U <user> -d <db> -f backend/database/02-site-status-notify.sql
+-- The statements are idempotent, so running the script twice is safe.
+
+-- Sends {"id", "name", "url", "status"} on the site_status channel when a crawl finishes.
+-- The crawler uploads raw_data before it marks a site done, so listeners can read it right away.
+CREATE OR REPLACE FUNCTION notify_site_status() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.status IN ('done', 'failed') AND NEW.status IS DISTINCT FROM OLD.status THEN
+        PERFORM pg_notify('site_status', json_build_object(
+            'id', NEW.id,
+            'name', NEW.name,
+            'url', NEW.url,
+            'status', NEW.status
+        )::text);
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sites_status_notify ON sites;
+CREATE TRIGGER sites_status_notify
+    AFTER UPDATE OF status ON sites
+    FOR EACH ROW EXECUTE FUNCTION notify_site_status();
+
+-- Lookups of a single site by url, used as the fallback when a notification is missed.
+CREATE INDEX IF NOT EXISTS sites_url_idx ON sites (url);
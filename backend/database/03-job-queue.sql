@@ -0,0 +1,25 @@
+-- Durable queue of background jobs, processed by worker.py of the procurement explorer.
+-- Runs after 02-site-status-notify.sql on a fresh database. For an existing database apply it manually:
+--   psql -h <host> -U <user> -d <db> -f backend/database/03-job-queue.sql
+-- The statements are idempotent, so running the script twice is safe.
+
+CREATE TABLE IF NOT EXISTS job_queue (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR NOT NULL,                     -- Name of the handler that processes the job
+    payload JSONB NOT NULL DEFAULT '{}',       -- Arguments of the handler
+    status VARCHAR NOT NULL DEFAULT 'queued',  -- queued, running, done or failed
+    attempts INTEGER NOT NULL DEFAULT 0,       -- Number of started attempts
+    max_attempts INTEGER NOT NULL DEFAULT 3,   -- The job fails for good after this many attempts
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- Earliest start, pushed back by retries
+    locked_by VARCHAR,                         -- Worker running the job
+    locked_until TIMESTAMP,                    -- A running job past this time is picked up again
+    result JSONB,                              -- Return value of the handler
+    last_error TEXT,                           -- Error of the last failed attempt
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,                      -- Start of the last attempt
+    finished_at TIMESTAMP
+);
+
+-- Claiming only scans the jobs that can run
+CREATE INDEX IF NOT EXISTS job_queue_claim_idx ON job_queue (run_at) WHERE status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS job_queue_status_idx ON job_queue (status);
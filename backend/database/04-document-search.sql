@@ -0,0 +1,29 @@
+-- Stored results of /companies/by-document, so repeated uploads of a file skip the LLM.
+-- Runs after 03-job-queue.sql on a fresh database. For an existing database apply it manually:
+--   psql -h <host> -U <user> -d <db> -f backend/database/04-document-search.sql
+-- The statements are idempotent, so running the script twice is safe.
+
+ALTER TABLE documents
+    ADD COLUMN IF NOT EXISTS content_hash VARCHAR,          -- sha256 of the uploaded file
+    ADD COLUMN IF NOT EXISTS profile TEXT,                  -- Generated document profile
+    ADD COLUMN IF NOT EXISTS embedding DOUBLE PRECISION[],  -- Embedding of the profile
+    ADD COLUMN IF NOT EXISTS search_results INTEGER NOT NULL DEFAULT 0,      -- Results of the last search
+    ADD COLUMN IF NOT EXISTS search_exhausted BOOLEAN NOT NULL DEFAULT FALSE; -- It returned fewer than asked
+
+CREATE UNIQUE INDEX IF NOT EXISTS documents_content_hash_idx ON documents (content_hash);
+
+-- Chroma distances are floating point
+ALTER TABLE document_suitable_companies ALTER COLUMN distance TYPE DOUBLE PRECISION;
+ALTER TABLE document_suitable_companies ADD COLUMN IF NOT EXISTS rank INTEGER;  -- 0 is the best match
+
+CREATE UNIQUE INDEX IF NOT EXISTS document_suitable_companies_rank_idx
+    ON document_suitable_companies (document_id, rank);
+
+-- Deleting a company or a document removes its matches
+ALTER TABLE document_suitable_companies
+    DROP CONSTRAINT IF EXISTS document_suitable_companies_document_id_fkey,
+    ADD CONSTRAINT document_suitable_companies_document_id_fkey
+        FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
+    DROP CONSTRAINT IF EXISTS document_suitable_companies_company_id_fkey,
+    ADD CONSTRAINT document_suitable_companies_company_id_fkey
+        FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE;
@@ -2,11 +2,15 @@ from dotenv import load_dotenv
 
 load_dotenv()
 import logging
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.endpoints import router as api_router
+from src.connectors.http_client import close_session
+from src.connectors.postgres_conector import PostgresConnector
+from src.services.document_service import db, site_listener
 from src.utils.logger_config import setup_logging
 
 # Set up logging
@@ -15,8 +19,18 @@ logger = logging.getLogger()  # Get root logger
 logger.info("Starting application")
 logger.info("Tested updated instance")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await site_listener.close()
+    await close_session()
+    await db.close()
+    PostgresConnector.close_pools()
+
+
 # Create FastAPI app
-app = FastAPI(title="Procurement explorer API")
+app = FastAPI(title="Procurement explorer API", lifespan=lifespan)
 app.include_router(api_router)
 
 app.add_middleware(
@@ -1,5 +1,6 @@
 import os
 import pathlib
+import sys
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
@@ -13,6 +14,7 @@ vs.build_vector_collection(
     chunk_size=4000,
     container="companies",
     cache=False,
+    sync="--sync" in sys.argv,  # reconcile the existing index instead of rebuilding it
 )
 
 print(vs.persistent_client.list_collections())
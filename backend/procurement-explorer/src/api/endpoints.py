@@ -1,18 +1,19 @@
+import asyncio
 import os
+import time
 from datetime import datetime
 from typing import Annotated, Any, List, Optional, Union
 import logging
-from fastapi import APIRouter, BackgroundTasks, File, HTTPException
+from fastapi import APIRouter, BackgroundTasks, File, HTTPException, UploadFile
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from langchain_core.documents import Document
 from pydantic import BaseModel, ValidationError
 
 from ..models.models import Company, CompanyInput, DueDiligenceProfile, DueDiligenceProfileInvalidError
+from ..services.bulk_loader import BulkLoader, LoadJob
 from ..services.database_initialization import (
     get_initialization_data,
     load_dd_profiles,
-    parse_company_profile
 )
 from ..services.dd_service import (
     delete_dd_profile_from_cache,
@@ -20,34 +21,47 @@ from ..services.dd_service import (
     start_dd_process,
 )
 from ..services.document_service import (
-    build_company_model_from_company_profile,
     build_initial_company_model,
     delete_company,
+    db,
     delete_due_diligence_profile_db,
     get_companies_similarity_profiles,
     get_company,
     get_company_by_name,
     get_company_by_website,
     get_count_documents,
+    get_document_matches,
+    get_document_search,
+    get_document_search_by_id,
     get_due_diligence_by_website_db,
-    get_text,
-    get_text_from_crawler,
     query_companies,
+    save_document_search,
     set_company,
+    set_document_matches,
     update_company,
     update_company_status,
     update_due_diligence_profile,
 )
+from ..services.hybrid_search import hybrid_search
+from ..services.job_queue import JobQueue
+from ..services.jobs import COMPANY_PROFILE_JOB
 from ..services.llm.llm_service import (
     generate_document_profile,
-    new_generate_company_profile,
+    llm_client,
 )
 from ..services.sanctions_checker_service import SanctionsChecker
+from ..services.text_extraction import (
+    DocumentTooLargeError,
+    content_hash,
+    detect_file_type,
+    iter_text,
+)
 from ..services.vector_store_service import VectorStoreService
 from .dummy import due_diligence_db
 from .wrappers import (
     CompanyWrapper,
     DueDiligenceProfileWrapper,
+    map_companies_to_wrappers,
     map_company_to_wrapper,
     map_due_diligence_to_wrapper,
     map_wrapper_to_due_diligence,
@@ -57,38 +71,16 @@ from .wrappers import (
 router = APIRouter()
 sanctions_checker = SanctionsChecker()
 vs = VectorStoreService(vector_store_name="company_vector_store")
+bulk_loader = BulkLoader(vs)
+job_queue = JobQueue(db)
+# Matches stored when a document is processed, later pages are searched on demand
+DOCUMENT_SEARCH_RESULTS = int(os.getenv("DOCUMENT_SEARCH_RESULTS", 50))
 logger = logging.getLogger(__name__)
 
 
-async def insert_company(id: int, url: str):
-    url_text: Document | None = await get_text_from_crawler(str(url))
-    if url_text is None:
-        return JSONResponse(
-            content={"error": "Failed to extract text from the provided URL."}
-        )
-
-    # Step 1: Generate company profile
-    response = new_generate_company_profile(url_text)
-    if isinstance(response, dict):
-        return response
-
-    # Step 2: Build company object out of the company profile
-    company = build_company_model_from_company_profile(
-        url, response, status="Waiting for Review"
-    )
-
-   #company.Verdict = "NOT CONFIRMED"
-    company.id = id
-    company.Status = "Waiting for Review"
-    company = await update_company(id, company)
-   
-    return {"id": id, "status": company.Status}
-
-
 @router.post("/companies/add")
 async def add_company(
     input: CompanyInput,  # TODO: Check the CompanyInput model
-    background_tasks: BackgroundTasks,
 ):
     url = input.website
     # Step 0: Check if the company already exists in the database
@@ -98,9 +90,22 @@ async def add_company(
     # Step 1: Insert the company
     initial_company = build_initial_company_model(url)
     id = await set_company(initial_company)
-    # Step 2: use insert_company to get the company profile, running it as a background task
-    background_tasks.add_task(insert_company, id, url)
-    return {"id": id, "status": initial_company.Status}
+    # Step 2: queue the generation of the company profile, it is run by worker.py
+    job_id = await job_queue.enqueue(COMPANY_PROFILE_JOB, {"id": id, "url": url})
+    return {"id": id, "status": initial_company.Status, "job_id": job_id}
+
+
+@router.get("/jobs/metrics")
+async def get_job_metrics() -> dict[str, int | float]:
+    return await job_queue.stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int) -> dict[str, Any]:
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 @router.get("/companies")
@@ -111,8 +116,10 @@ async def get_companies(
     country: Optional[Union[str, List[str]]] = None,
     limit: int = 20,
     offset: int = 0,
-) -> dict[str, list[Any] | int]:
-    companies = await query_companies(
+    last_id: Optional[int] = None,
+    ranked: bool = False,
+) -> dict[str, list[Any] | int | None]:
+    companies, total = await query_companies(
         query=query,
         status=status,
         industry=industry,
@@ -120,24 +127,59 @@ async def get_companies(
         #verdict="CONFIRMED",
         limit=limit,
         offset=offset,
+        last_id=last_id,
+        with_total=True,
+        ranked=ranked,
     )
 
-    companies_all = await query_companies(
-        query=query,
+    companies_wrapped = await map_companies_to_wrappers(companies)
+    companies_wrapped = jsonable_encoder(companies_wrapped)
+
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "last_id": companies[-1].id if companies else None,
+        "companies": companies_wrapped,
+    }
+
+
+@router.get("/companies/hybrid")
+async def search_companies_hybrid(
+    query: str,
+    status: Optional[Union[str, List[str]]] = ["CONFIRMED"],
+    industry: Optional[Union[str, List[str]]] = None,
+    country: Optional[Union[str, List[str]]] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> dict[str, Any]:
+    """
+    Search companies by name and by capabilities at once: full-text and vector results
+    are fused into one ranking. "total" is the number of full-text matches, capped at
+    HYBRID_MAX_CANDIDATES (null if the full-text search failed), and "candidates" the
+    number of fused results the page was taken from. "scores" holds the fused and
+    per-source scores of each company by id, "sources" the status and latency of each
+    retriever.
+    """
+    hits, total, candidates, sources = await hybrid_search(
+        query,
+        limit=limit,
+        offset=offset,
         status=status,
         industry=industry,
         country=country,
-        #verdict="CONFIRMED"
     )
-
-    companies_wrapped = [await map_company_to_wrapper(company) for company in companies]
-    companies_wrapped = jsonable_encoder(companies_wrapped)
-
+    companies_wrapped = await map_companies_to_wrappers([hit.company for hit in hits])
     return {
-        "total": len(companies_all),
+        "total": total,
+        "candidates": candidates,
         "offset": offset,
         "limit": limit,
-        "companies": companies_wrapped,
+        "companies": jsonable_encoder(companies_wrapped),
+        "scores": {
+            hit.company.id: hit.model_dump(exclude={"company"}) for hit in hits
+        },
+        "sources": {name: report.model_dump() for name, report in sources.items()},
     }
 
 
@@ -145,38 +187,49 @@ async def get_companies(
 async def get_all_added_companies(
     limit: int = 20,
     offset: int = 0,
-) -> dict[str, list[Any] | int]:
-    companies = await query_companies(
+    last_id: Optional[int] = None,
+) -> dict[str, list[Any] | int | None]:
+    companies, total = await query_companies(
         exclude_status=["CONFIRMED"], 
         limit=limit,
         offset=offset,
+        last_id=last_id,
+        with_total=True,
         )
-    companies_all = await query_companies(
-        exclude_status=["CONFIRMED"],
-        )
-    companies_wrapped = [
-        await map_company_to_wrapper(company) for company in companies
-    ]
+    companies_wrapped = await map_companies_to_wrappers(companies)
     return{
-        "total": len(companies_all),
+        "total": total,
         "offset": offset,
         "limit": limit,
+        "last_id": companies[-1].id if companies else None,
         "companies": companies_wrapped,
     }
 
 
 @router.get("/companies/similar")
-async def find_similar_companies(text: str, k: int = 10):
+async def find_similar_companies(
+    text: str,
+    k: int = 10,
+    country: Optional[str] = None,
+    industry: Optional[str] = None,
+    risk_level: Optional[int] = None,
+):
     """
     Find companies similar to the input company.
+    Optionally restrict the search to a country, industry or risk level.
     """
     response = vs.query_vector_collection(
-        text, collection_name="company_profile_nomic", k=k
+        text,
+        collection_name="company_profile_nomic",
+        k=k,
+        country=country,
+        industry=industry,
+        risk_level=risk_level,
+    )
+    matches = await get_companies_similarity_profiles(response)
+    companies_wrapped = await map_companies_to_wrappers(
+        [company for company, _ in matches], [score for _, score in matches]
     )
-    companies = await get_companies_similarity_profiles(response)
-    companies_wrapped = [
-        await map_company_to_wrapper(company) for company in companies if company is not None
-    ]
     companies_wrapped = jsonable_encoder(companies_wrapped)
     return companies_wrapped
 
@@ -198,7 +251,7 @@ async def find_company_by_name(name: str):
     if companies is None:
         raise HTTPException(status_code=404, detail="Company not found")
     # Map each company to the wrapper
-    companies_wrapped = [await map_company_to_wrapper(company) for company in companies]
+    companies_wrapped = await map_companies_to_wrappers(companies)
 
     return companies_wrapped
 
@@ -209,27 +262,123 @@ async def get_company_count() -> JSONResponse:
     return {"count": count}
 
 
+async def match_document_companies(
+    document_id: int, profile: str, embedding: List[float], num_results: int
+) -> None:
+    """Search the companies closest to a document profile and store them as its matches."""
+    results = await asyncio.to_thread(
+        vs.query_vector_collection,
+        profile,
+        collection_name="company_profile_nomic",
+        k=num_results,
+        query_embedding=embedding,
+    )
+    matches = [(int(result["Id"]), result["Score"]) for result in results]
+    # fewer results than asked for means the index has no more companies to offer
+    await set_document_matches(document_id, matches, len(results) < num_results)
+
+
+async def get_document_companies_page(
+    document: dict, k: int, offset: int, refresh: bool, timings: dict
+) -> dict[str, Any]:
+    # search again with the stored embedding if asked to, or if the page is not stored
+    # yet and the last search did not already return every company
+    start = time.perf_counter()
+    if refresh or (
+        offset + k > document["search_results"] and not document["search_exhausted"]
+    ):
+        await match_document_companies(
+            document["id"],
+            document["profile"],
+            document["embedding"],
+            max(offset + k, DOCUMENT_SEARCH_RESULTS),
+        )
+    matches = await get_document_matches(document["id"], offset, k)
+
+    companies_wrapped = await map_companies_to_wrappers(
+        [company for company, _ in matches], [distance for _, distance in matches]
+    )
+    companies_wrapped = jsonable_encoder(companies_wrapped)
+    timings["search"] = {"seconds": time.perf_counter() - start}
+    return {
+        "companies_list": companies_wrapped,
+        "distances": [distance for _, distance in matches],
+        "document_profile": document["profile"],
+        "document_id": document["id"],
+        "timings": timings,
+    }
+
+
 @router.post("/companies/by-document")
 async def find_companies_by_document(
-    file: Annotated[bytes, File(description="A file read as bytes")],
-    content_type="application/pdf",
+    file: Annotated[UploadFile, File(description="A PDF or DOCX document")],
     k: int = 10,
+    offset: int = 0,
+    refresh: bool = False,
+    regenerate: bool = False,
 ):
-    document_text = get_text(file, content_type)
-    # create document profile for similarity search
-    doc_profile = generate_document_profile(document_text)
+    """
+    Match companies to an uploaded document. The profile of a file and its matches are
+    stored by content hash: refresh=true searches the matches again, regenerate=true
+    profiles the document again as well. The file type is detected from the content.
+    """
+    timings = {}
+    try:
+        file_hash = await asyncio.to_thread(content_hash, file.file)
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    # repeated uploads of a file are served from the stored profile and matches
+    document = await get_document_search(file_hash)
+    if document is not None and (regenerate or not (document["profile"] or "").strip()):
+        document = None
+    cached = document is not None
+    if not cached:
+        file_type = await asyncio.to_thread(detect_file_type, file.file)
+        if file_type is None:
+            raise HTTPException(
+                status_code=415, detail="Unsupported document type, expected PDF or DOCX"
+            )
+        # the pages are extracted while the first chunks are already being profiled
+        pages = iter_text(file.file, file_type)
+        doc_profile = await generate_document_profile(pages, timings=timings)
+        if isinstance(doc_profile, dict):
+            raise HTTPException(status_code=500, detail=doc_profile)
+        # never store an empty profile, later uploads of the file would be served it
+        if not doc_profile.strip():
+            raise HTTPException(
+                status_code=422, detail="No text could be extracted from the document"
+            )
 
-    response = vs.query_vector_collection(
-         doc_profile, collection_name="company_profile_nomic", k=k
-    )
-    companies = await get_companies_similarity_profiles(response)
-    companies.append(None)
-    
-    companies_wrapped = [
-         await map_company_to_wrapper(company) for company in companies if company is not None
-     ]
-    companies_wrapped = jsonable_encoder(companies_wrapped)
-    return {"companies_list": companies_wrapped, "document_profile": doc_profile}
+        embedding = await asyncio.to_thread(
+            VectorStoreService.DEFAULT_EMBEDDING_MODEL.embed_query, doc_profile
+        )
+        document_id = await save_document_search(
+            file.filename or f"document-{file_hash[:12]}", file_hash, doc_profile, embedding
+        )
+        document = {
+            "id": document_id,
+            "profile": doc_profile,
+            "embedding": embedding,
+            "search_results": 0,
+            "search_exhausted": False,
+        }
+
+    response = await get_document_companies_page(document, k, offset, refresh, timings)
+    response["cached"] = cached
+    return response
+
+
+@router.get("/documents/{document_id}/companies")
+async def get_document_companies(
+    document_id: int,
+    k: int = 10,
+    offset: int = 0,
+    refresh: bool = False,
+):
+    document = await get_document_search_by_id(document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return await get_document_companies_page(document, k, offset, refresh, {})
     
 
 @router.put("/companies/{id}/status")
@@ -421,38 +570,40 @@ async def delete_due_diligence_profile_(
 @router.post("/database/load")
 async def initial_db_loading(
     password: str,
+    background_tasks: BackgroundTasks,
 ):
     # only possible with authentication
     if password != os.getenv("POSTGRES_PASSWORD"):
         return "Access Denied: Wrong Password"
 
-    start_time = datetime.now()
     companies = get_initialization_data()
-    num_inserts = 0
+    job = bulk_loader.create_job(total=len(companies))
+    # insert and embed the companies in the background, progress is polled by job id
+    background_tasks.add_task(bulk_loader.run, job, companies)
+    return job
 
-    # run the inserts for each company in loading file
-    for idx, company in enumerate(companies[:1000]):
-        
-        company_profile, website = parse_company_profile(company, idx)
-        existing_company = await get_company_by_website(website)
-       
-        # : If company is already in database, skipp
-        if existing_company:
-            continue
 
-        # Step 3: Build company object out of the company profile
-        company = build_company_model_from_company_profile(
-            website, company_profile, status="CONFIRMED"
-        )
-        #company.Status = "CONFIRMED"
-        company.Verdict = "CONFIRMED"
-        # Step 3: Store the company object in the database
-        id = await set_company(company)
-        # Step 4: Generate the embeddings for the company profile
-        vs.add_document_to_vector_store(id, company)
-        num_inserts += 1
-        # return company
-    return {"duration": datetime.now() - start_time, "num_inserts": num_inserts}
+@router.get("/database/load/{job_id}")
+async def get_db_loading_progress(job_id: str) -> LoadJob:
+    job = bulk_loader.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Loading job not found")
+    return job
+
+
+@router.get("/embeddings/cache")
+async def get_embedding_cache_stats() -> dict[str, int | float]:
+    return VectorStoreService.EMBEDDING_CACHE.stats()
+
+
+@router.get("/llm/cache")
+async def get_llm_cache_stats() -> dict[str, int | float]:
+    return llm_client.CACHE.stats()
+
+
+@router.get("/database/pool")
+async def get_database_pool_stats() -> dict[str, int | float]:
+    return db.pool_stats()
 
 
 @router.post("/database/due-diligence/load")
@@ -4,7 +4,7 @@ from typing import Dict, List, Optional
 
 from fastapi import UploadFile
 from pydantic import BaseModel, ConfigDict
-from ..services.document_service import get_due_diligence_status
+from ..services.document_service import get_due_diligence_status, get_due_diligence_statuses
 
 from ..models.models import (
     Company,
@@ -41,6 +41,7 @@ class CompanyWrapper(BaseModel):
     added_timestamp: Optional[datetime] = None
     details: Optional[DetailsWrapper] = None
     company_profile: Optional[str] = None
+    score: Optional[float] = None  # Distance to the query, in similarity searches
 
 
 class DueDiligenceProfileWrapper(BaseModel):
@@ -108,7 +109,33 @@ async def map_company_to_wrapper(company: Company) -> CompanyWrapper | None:
     dd_profile = None
     if company and company.Website:
         dd_profile: DueDiligenceProfile = await get_due_diligence_status(company.Website)
-    
+
+    return build_company_wrapper(company, dd_profile)
+
+
+async def map_companies_to_wrappers(
+    companies: List[Company], scores: Optional[List[float]] = None
+) -> List[CompanyWrapper]:
+    """Map a page of companies, resolving all due diligence statuses in one batch.
+    :param scores: Similarity scores of the companies, in the same order."""
+    if scores is None:
+        scores = [None] * len(companies)
+    scored = [(company, score) for company, score in zip(companies, scores) if company is not None]
+    dd_profiles = await get_due_diligence_statuses(
+        [company.Website for company, _ in scored if company.Website]
+    )
+    wrappers = []
+    for company, score in scored:
+        wrapper = build_company_wrapper(company, dd_profiles.get(company.Website))
+        if wrapper is not None:
+            wrapper.score = score
+            wrappers.append(wrapper)
+    return wrappers
+
+
+def build_company_wrapper(
+    company: Company, dd_profile: Optional[DueDiligenceProfile] = None
+) -> CompanyWrapper | None:
     try:
         kwargs = dict(
             id=company.id,
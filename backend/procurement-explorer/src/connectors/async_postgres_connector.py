@@ -0,0 +1,244 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+
+class AsyncPostgresConnector:
+    def __init__(self, database_name: Optional[str] = None):
+        """
+        Initialize the AsyncPostgresConnector with environment variables.
+        The connection pool is opened lazily on the first query, inside the running event loop.
+        :param database_name: The database name can be passed, but it will use the one from env if not provided.
+        """
+        self.conn_params = {
+            "dbname": database_name if database_name else os.getenv("POSTGRES_DB"),
+            "user": os.getenv("POSTGRES_USER"),
+            "password": os.getenv("POSTGRES_PASSWORD"),
+            "host": os.getenv("POSTGRES_URL"),
+            "port": os.getenv("POSTGRES_PORT"),
+        }
+        self.pool = AsyncConnectionPool(
+            kwargs={**self.conn_params, "row_factory": dict_row},
+            min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", 1)),
+            max_size=int(os.getenv("POSTGRES_POOL_SIZE", 10)),
+            timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", 30)),
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+
+    async def open(self) -> None:
+        """
+        Opens the connection pool if it is not open yet.
+        :raises psycopg_pool.PoolTimeout: If the minimum number of connections cannot be established.
+        """
+        if self._opened:
+            return
+        async with self._open_lock:
+            if not self._opened:
+                await self.pool.open(wait=True)
+                self._opened = True
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[psycopg.AsyncCursor]:
+        """
+        Opens a transaction scoped to a single pool checkout.
+        The pool commits when the block exits normally and rolls back if it raises.
+        :yield: A cursor returning rows as dictionaries.
+        :raises psycopg.Error: If the connection or any statement fails.
+        """
+        await self.open()
+        async with self.pool.connection() as conn:
+            async with conn.cursor() as cur:
+                yield cur
+
+    async def execute_query(self, query, params=None, fetch=False, fetchone=False):
+        """
+        Executes a raw SQL query and returns the results if needed.
+        :param query: The SQL query to execute.
+        :param params: Parameters for the SQL query.
+        :param fetch: If True, fetch all results. Default is False.
+        :param fetchone: If True, fetch a single result. Default is False.
+        :return: Query results or None if not fetching.
+        :raises psycopg.Error: If the query fails.
+        """
+        async with self.transaction() as cur:
+            await cur.execute(query, params)
+
+            if fetchone:
+                return await cur.fetchone()
+            if fetch:
+                return await cur.fetchall()
+
+            return None  # No result needed if not fetching
+
+    def pool_stats(self) -> dict:
+        """
+        Returns the metrics of the connection pool.
+        """
+        stats = self.pool.get_stats()
+        return {
+            "size": stats.get("pool_size", 0),
+            "max_size": stats.get("pool_max", self.pool.max_size),
+            "idle": stats.get("pool_available", 0),
+            "checkouts": stats.get("requests_num", 0),
+            "waits": stats.get("requests_queued", 0),
+            "wait_time": stats.get("requests_wait_ms", 0) / 1000,
+            "errors": stats.get("requests_errors", 0) + stats.get("connections_errors", 0),
+        }
+
+    # ------------------ MongoDB-like Interface --------------------
+
+    async def upload_document(self, collection_name: str, document: dict) -> str:
+        """
+        Inserts a document into the specified table (collection).
+        :param collection_name: The name of the table in PostgreSQL.
+        :param document: The dictionary of data to insert.
+        :return: The ID of the inserted document.
+        """
+        columns = ", ".join(document.keys())
+        values = ", ".join([f"%({k})s" for k in document.keys()])
+        query = (
+            f"INSERT INTO {collection_name} ({columns}) VALUES ({values}) RETURNING id;"
+        )
+        result = await self.execute_query(
+            query, document, fetchone=True
+        )  # Fetch one to get the returned ID
+        return str(result["id"]) if result else ""
+
+    async def upload_documents(
+        self,
+        collection_name: str,
+        documents: List[dict],
+        returning: str = "id",
+        conflict_column: Optional[str] = None,
+    ) -> List[dict]:
+        """
+        Inserts several documents into the specified table with one multi-row INSERT.
+        :param collection_name: The name of the table in PostgreSQL.
+        :param documents: The dictionaries of data to insert; all must have the same keys.
+        :param returning: The columns returned for each inserted row.
+        :param conflict_column: If set, rows conflicting on this unique column are skipped.
+        :return: The returned columns of the inserted rows.
+        """
+        if not documents:
+            return []
+        keys = list(documents[0].keys())
+        row = "(" + ", ".join(["%s"] * len(keys)) + ")"
+        query = (
+            f"INSERT INTO {collection_name} ({', '.join(keys)}) "
+            f"VALUES {', '.join([row] * len(documents))}"
+        )
+        if conflict_column:
+            query += f" ON CONFLICT ({conflict_column}) DO NOTHING"
+        query += f" RETURNING {returning};"
+        params = [document[key] for document in documents for key in keys]
+        return await self.execute_query(query, params, fetch=True)
+
+    async def download_document(self, collection_name: str, document_id: str) -> dict:
+        """
+        Retrieves a document by ID from the specified table (collection).
+        :param collection_name: The name of the table in PostgreSQL.
+        :param document_id: The ID of the document to retrieve.
+        :return: The document data as a dictionary.
+        """
+        query = f"SELECT * FROM {collection_name} WHERE id = %s;"
+        result = await self.execute_query(query, (document_id,), fetchone=True)
+        return result if result else {}
+
+    async def update_document(
+        self, collection_name: str, document_id: str, update_data: dict
+    ) -> None:
+        """
+        Updates a document in a table by ID.
+        :param collection_name: The name of the table in PostgreSQL.
+        :param document_id: The ID of the document to update.
+        :param update_data: The dictionary of fields to update.
+        """
+        set_clause = ", ".join([f"{k} = %({k})s" for k in update_data.keys()])
+        query = f"UPDATE {collection_name} SET {set_clause} WHERE id = %(document_id)s;"
+        update_data["document_id"] = document_id
+        await self.execute_query(query, update_data)
+
+    async def read_json_document(self, collection_name: str, document_id: str) -> dict:
+        """
+        Reads a JSON document and returns it as a dictionary.
+        :param collection_name: The name of the table.
+        :param document_id: The document ID to fetch.
+        :return: The document as a dictionary.
+        """
+        return await self.download_document(collection_name, document_id)
+
+    async def list_documents(self, collection_name: str) -> List[str]:
+        """
+        Lists all documents (by ID) in a specified table.
+        :param collection_name: The name of the table in PostgreSQL.
+        :return: A list of document IDs.
+        """
+        query = f"SELECT id FROM {collection_name};"
+        results = await self.execute_query(query, fetch=True)
+        return [str(row["id"]) for row in results] if results else []
+
+    async def check_document_exists(self, collection_name: str, document_id: str) -> bool:
+        """
+        Checks if a document exists in the table by ID.
+        :param collection_name: The name of the table in PostgreSQL.
+        :param document_id: The document ID to check.
+        :return: True if the document exists, False otherwise.
+        """
+        query = f"SELECT 1 FROM {collection_name} WHERE id = %s;"
+        result = await self.execute_query(query, (document_id,), fetchone=True)
+        return result is not None
+
+    async def get_last_n_documents(self, collection_name: str, limit: int) -> List[dict]:
+        """
+        Retrieves the most recently added documents from a table.
+        :param collection_name: The name of the table in PostgreSQL.
+        :param limit: The number of documents to retrieve.
+        :return: A list of the most recent documents.
+        """
+        query = f"SELECT * FROM {collection_name} ORDER BY id DESC LIMIT %s;"
+        return await self.execute_query(query, (limit,), fetch=True)
+
+    async def count_documents(self, collection_name: str) -> int:
+        """
+        Counts the number of documents in a table.
+        :param collection_name: The name of the table in PostgreSQL.
+        :return: The count of documents in the table.
+        """
+        query = f"SELECT COUNT(*) FROM {collection_name};"
+        result = await self.execute_query(query, fetchone=True)
+        return result["count"] if result else 0
+
+    async def get_document(self, collection_name: str, name: str) -> Optional[dict]:
+        """
+        Retrieves a document by its name from a table.
+        :param collection_name: The name of the table in PostgreSQL.
+        :param name: The name of the document.
+        :return: The document data as a dictionary.
+        """
+        query = f"SELECT * FROM {collection_name} WHERE name = %s;"
+        return await self.execute_query(query, (name + ".json",), fetchone=True)
+
+    async def delete_document(self, collection_name: str, document_id: str) -> None:
+        """
+        Deletes a document from a table by ID.
+        :param collection_name: The name of the table in PostgreSQL.
+        :param document_id: The ID of the document to delete.
+        """
+        query = f"DELETE FROM {collection_name} WHERE id = %s;"
+        await self.execute_query(query, (document_id,))
+
+    async def close(self) -> None:
+        """
+        Closes the connection pool.
+        """
+        if self._opened:
+            await self.pool.close()
+            self._opened = False
@@ -0,0 +1,27 @@
+from typing import Optional
+
+import aiohttp
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the aiohttp session shared by all outgoing API calls of the process.
+    Reusing it keeps the connections to the crawler and due diligence APIs alive
+    between calls. It is created lazily, inside the running event loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession()
+    return _session
+
+
+async def close_session() -> None:
+    """
+    Closes the shared session, if it was created.
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
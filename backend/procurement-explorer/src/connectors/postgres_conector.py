@@ -1,15 +1,222 @@
-from typing import Optional, List
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional, List
 import os
+import threading
+import time
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import RealDictCursor
-from typing import Optional
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
+
+
+class PoolClosedError(psycopg2.InterfaceError):
+    """Raised when a connection is requested from a closed pool."""
+
+
+class PostgresConnectionPool:
+    """
+    Bounded, thread-safe pool of long-lived psycopg2 connections.
+
+    Connections are opened lazily up to ``max_size`` and kept open between checkouts.
+    A connection that has been idle for longer than ``health_check_interval`` seconds
+    is pinged with ``SELECT 1`` before it is handed out and replaced if it is broken.
+    """
+
+    def __init__(
+        self,
+        conn_params: dict,
+        max_size: int = 10,
+        checkout_timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+    ):
+        """
+        :param conn_params: Keyword arguments passed to psycopg2.connect.
+        :param max_size: Maximum number of open connections.
+        :param checkout_timeout: Seconds to wait for a free connection before failing.
+        :param health_check_interval: Idle seconds after which a connection is pinged on checkout.
+        """
+        self.conn_params = conn_params
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()  # (connection, last_used) pairs, most recently used last
+        self._size = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.reconnects = 0
+        self._closed = False
+
+    def _acquire_slot(self):
+        """
+        Reserve either an idle connection or the right to open a new one.
+        :return: An idle (connection, last_used) pair, or None if a new connection should be opened.
+        :raises PoolTimeoutError: If the pool stays exhausted for longer than checkout_timeout.
+        :raises PoolClosedError: If the pool has been closed.
+        """
+        with self._condition:
+            if self._closed:
+                raise PoolClosedError("Connection pool is closed")
+            self.checkouts += 1
+            if not self._idle and self._size >= self.max_size:
+                self.waits += 1
+                started = time.monotonic()
+                deadline = started + self.checkout_timeout
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.wait_time += time.monotonic() - started
+                        raise PoolTimeoutError(
+                            f"No connection available within {self.checkout_timeout}s "
+                            f"(pool size {self.max_size})"
+                        )
+                    self._condition.wait(remaining)
+                self.wait_time += time.monotonic() - started
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+            return None
+
+    def _discard(self, conn) -> None:
+        """
+        Close a connection and free its slot in the pool.
+        """
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        """
+        Check that a pooled connection is still usable.
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Check a connection out of the pool, opening or replacing one if needed.
+        :return: An open psycopg2 connection.
+        :raises psycopg2.Error: If a new connection cannot be established.
+        """
+        idle = self._acquire_slot()
+        if idle is not None:
+            conn, last_used = idle
+            if self._is_healthy(conn, last_used):
+                return conn
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+            with self._condition:
+                self.reconnects += 1
+        try:
+            return psycopg2.connect(**self.conn_params)
+        except psycopg2.Error:
+            with self._condition:
+                self._size -= 1
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """
+        Return a connection to the pool. Broken connections, and every connection
+        returned after the pool was closed, are closed instead of reused.
+        :param conn: The connection previously obtained from getconn.
+        :param discard: If True, close the connection instead of keeping it.
+        """
+        discard = discard or self._closed
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed:
+            with self._condition:
+                self._in_use -= 1
+            self._discard(conn)
+            return
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """
+        Context manager that checks out a connection and always returns it to the pool.
+        """
+        conn = self.getconn()
+        try:
+            yield conn
+        except psycopg2.InterfaceError:
+            self.putconn(conn, discard=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool metrics.
+        """
+        with self._condition:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 3),
+                "reconnects": self.reconnects,
+            }
+
+    def close(self) -> None:
+        """
+        Close all idle connections. Connections that are checked out are closed on return.
+        """
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._discard(conn)
 
 
 class PostgresConnector:
-    def __init__(self, database_name: Optional[str] = None):
+    _pools: dict = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, database_name: Optional[str] = None, pooled: bool = False):
         """
         Initialize the PostgresConnector with environment variables.
         :param database_name: The database name can be passed, but it will use the one from env if not provided.
+        :param pooled: If True, queries reuse connections from a pool shared by all pooled
+            connectors with the same connection parameters instead of connecting per query.
         """
         self.conn_params = {
             "dbname": database_name if database_name else os.getenv("POSTGRES_DB"),
@@ -18,8 +225,46 @@ class PostgresConnector:
             "host": os.getenv("POSTGRES_URL"),
             "port": os.getenv("POSTGRES_PORT"),
         }
+        self.pooled = pooled
         self.connection = None
 
+    @property
+    def pool(self) -> PostgresConnectionPool:
+        """
+        The shared connection pool for these connection parameters, created on first use.
+        """
+        key = tuple(sorted(self.conn_params.items()))
+        with PostgresConnector._pools_lock:
+            pool = PostgresConnector._pools.get(key)
+            if pool is None:
+                pool = PostgresConnectionPool(
+                    self.conn_params,
+                    max_size=int(os.getenv("POSTGRES_POOL_SIZE", 10)),
+                    checkout_timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", 30)),
+                    health_check_interval=float(
+                        os.getenv("POSTGRES_POOL_HEALTH_CHECK_INTERVAL", 30)
+                    ),
+                )
+                PostgresConnector._pools[key] = pool
+            return pool
+
+    @classmethod
+    def close_pools(cls) -> None:
+        """
+        Closes the shared pools, at shutdown. Pooled connectors used afterwards get a new pool.
+        """
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def pool_stats(self) -> dict:
+        """
+        Returns the metrics of the shared pool, or an empty dict if the connector is not pooled.
+        """
+        return self.pool.stats() if self.pooled else {}
+
     def connect(self):
         """
         Establishes a connection to the PostgreSQL database.
@@ -32,32 +277,27 @@ class PostgresConnector:
                 raise e
         return self.connection
 
-    def execute_query(self, query, params=None, fetch=False, fetchone=False):
+    @contextmanager
+    def transaction(self) -> Iterator[RealDictCursor]:
         """
-        Executes a raw SQL query and returns the results if needed.
-        :param query: The SQL query to execute.
-        :param params: Parameters for the SQL query.
-        :param fetch: If True, fetch all results. Default is False.
-        :param fetchone: If True, fetch a single result. Default is False.
-        :return: Query results or None if not fetching.
-        :raises psycopg2.Error: If the query fails.
+        Opens a transaction scoped to a single connection checkout.
+        Commits when the block exits normally and rolls back if it raises.
+        In pooled mode the connection is returned to the pool, otherwise it is closed.
+        :yield: A RealDictCursor bound to the transaction.
+        :raises psycopg2.Error: If the connection or any statement fails.
         """
+        if self.pooled:
+            with self.pool.connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    yield cur
+                conn.commit()
+            return
+
         conn = self.connect()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query, params)
-
-                if fetchone:
-                    result = cur.fetchone()
-                    conn.commit()
-                    return result
-                if fetch:
-                    result = cur.fetchall()
-                    conn.commit()
-                    return result
-
-                conn.commit()  # Commit if it's an insert, update, or delete query
-                return None  # No result needed if not fetching
+                yield cur
+            conn.commit()
         except psycopg2.Error as e:
             if conn:
                 conn.rollback()  # Rollback the transaction if there's an error
@@ -66,6 +306,26 @@ class PostgresConnector:
             if conn:
                 conn.close()  # Always close the connection after executing the query
 
+    def execute_query(self, query, params=None, fetch=False, fetchone=False):
+        """
+        Executes a raw SQL query and returns the results if needed.
+        :param query: The SQL query to execute.
+        :param params: Parameters for the SQL query.
+        :param fetch: If True, fetch all results. Default is False.
+        :param fetchone: If True, fetch a single result. Default is False.
+        :return: Query results or None if not fetching.
+        :raises psycopg2.Error: If the query fails.
+        """
+        with self.transaction() as cur:
+            cur.execute(query, params)
+
+            if fetchone:
+                return cur.fetchone()
+            if fetch:
+                return cur.fetchall()
+
+            return None  # No result needed if not fetching
+
     # ------------------ MongoDB-like Interface --------------------
 
     def upload_document(self, collection_name: str, document: dict) -> str:
@@ -181,7 +441,8 @@ class PostgresConnector:
 
     def close_connection(self) -> None:
         """
-        Closes the PostgreSQL connection.
+        Closes the PostgreSQL connection. The shared pool is left open for the other
+        pooled connectors; close_pools closes it at shutdown.
         """
         if self.connection:
             self.connection.close()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional, Set
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresListener:
+    """
+    Listens on a Postgres NOTIFY channel with JSON payloads and hands each payload
+    to the futures registered for the value of its `key` field.
+    One connection serves every waiter of the process and is re-established if it drops.
+    """
+
+    RECONNECT_DELAY = 5
+
+    def __init__(self, channel: str, key: str, database_name: Optional[str] = None):
+        """
+        :param channel: The channel to LISTEN on.
+        :param key: The payload field the waiters are keyed by.
+        :param database_name: The database name can be passed, but it will use the one from env if not provided.
+        """
+        self.channel = channel
+        self.key = key
+        self.conn_params = {
+            "dbname": database_name if database_name else os.getenv("POSTGRES_DB"),
+            "user": os.getenv("POSTGRES_USER"),
+            "password": os.getenv("POSTGRES_PASSWORD"),
+            "host": os.getenv("POSTGRES_URL"),
+            "port": os.getenv("POSTGRES_PORT"),
+        }
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+        self._listening = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def register(self, value: str, timeout: float = 5) -> asyncio.Future:
+        """
+        Register a waiter for the next payload whose key field equals value.
+        Starts the listener if needed and waits up to timeout seconds for it to be listening,
+        so a notification sent after this call returns is not missed.
+        :return: A future resolved with the payload dictionary.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(value, set()).add(future)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._listening.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Not listening on {self.channel} yet, waiters rely on re-checks")
+        return future
+
+    def unregister(self, value: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(value)
+        if waiters is None:
+            return
+        waiters.discard(future)
+        if not waiters:
+            del self._waiters[value]
+
+    def _dispatch(self, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            logger.error(f"Invalid payload on {self.channel}: {payload}")
+            return
+        for future in self._waiters.get(data.get(self.key), ()):
+            if not future.done():
+                future.set_result(data)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    **self.conn_params, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {self.channel}")
+                    self._listening.set()
+                    async for notify in conn.notifies():
+                        self._dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Listener on {self.channel} failed, reconnecting: {e}")
+            finally:
+                self._listening.clear()
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    async def close(self) -> None:
+        """
+        Stops listening and closes the connection.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
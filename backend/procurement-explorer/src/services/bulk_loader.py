@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from ..models.models import Company
+from .database_initialization import parse_company_profile
+from .document_service import (
+    build_company_model_from_company_profile,
+    get_existing_websites,
+    set_companies,
+)
+from .vector_store_service import VectorStoreService
+
+logger = logging.getLogger(__name__)
+
+
+class LoadJob(BaseModel):
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"  # queued, running, completed or failed
+    total: int = 0
+    processed: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    embedded: int = 0
+    embedding_failures: int = 0
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class BulkLoader:
+    """
+    Loads company profiles into the database and the vector store in batches.
+    Each batch costs one query for the existing websites and one multi-row INSERT;
+    the inserted companies are then embedded in the background by at most
+    `concurrency` batches at a time, while the next batches are being inserted.
+    """
+
+    BATCH_SIZE = int(os.getenv("BULK_LOAD_BATCH_SIZE", 200))
+    CONCURRENCY = int(os.getenv("BULK_LOAD_CONCURRENCY", 4))
+
+    def __init__(
+        self,
+        vector_store: VectorStoreService,
+        batch_size: int = BATCH_SIZE,
+        concurrency: int = CONCURRENCY,
+    ):
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.jobs: Dict[str, LoadJob] = {}
+
+    def create_job(self, total: int) -> LoadJob:
+        job = LoadJob(total=total)
+        self.jobs[job.id] = job
+        return job
+
+    def get_job(self, job_id: str) -> Optional[LoadJob]:
+        return self.jobs.get(job_id)
+
+    async def run(self, job: LoadJob, companies: List[dict]) -> LoadJob:
+        """
+        Load the raw company profiles of the initial loading file, updating the job as it goes.
+        """
+        job.status = "running"
+        job.started_at = datetime.now()
+        slots = asyncio.Semaphore(self.concurrency)
+        embedding_tasks = []
+        try:
+            for start in range(0, len(companies), self.batch_size):
+                batch = companies[start:start + self.batch_size]
+                inserted = await self._insert_batch(job, batch, start)
+                if not inserted:
+                    continue
+                # Wait for a free slot, so inserts never run far ahead of the embeddings
+                await slots.acquire()
+                embedding_tasks.append(
+                    asyncio.create_task(self._embed_batch(job, inserted, slots))
+                )
+            await asyncio.gather(*embedding_tasks)
+            job.status = "completed"
+        except Exception as e:
+            logger.exception(f"Bulk load {job.id} failed")
+            await asyncio.gather(*embedding_tasks, return_exceptions=True)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+        return job
+
+    async def _insert_batch(
+        self, job: LoadJob, batch: List[dict], start: int
+    ) -> List[Tuple[str, Company]]:
+        profiles = {}
+        for idx, data in enumerate(batch, start):
+            company_profile, website = parse_company_profile(data, idx)
+            # The first profile of a website wins, like with one-by-one inserts
+            profiles.setdefault(website, company_profile)
+
+        existing = await get_existing_websites(list(profiles))
+        new_companies = []
+        for website, company_profile in profiles.items():
+            if website in existing:
+                continue
+            company = build_company_model_from_company_profile(
+                website, company_profile, status="CONFIRMED"
+            )
+            company.Verdict = "CONFIRMED"
+            new_companies.append(company)
+
+        ids = await set_companies(new_companies)
+        job.processed += len(batch)
+        job.inserted += len(ids)
+        job.skipped += len(batch) - len(ids)
+        return [
+            (str(ids[company.Website]), company)
+            for company in new_companies
+            if company.Website in ids
+        ]
+
+    async def _embed_batch(
+        self,
+        job: LoadJob,
+        companies: List[Tuple[str, Company]],
+        slots: asyncio.Semaphore,
+    ) -> None:
+        try:
+            await asyncio.to_thread(self.vector_store.add_documents_to_vector_store, companies)
+            job.embedded += len(companies)
+        except Exception as e:
+            # The companies are stored; `create_vector_store.py --sync` indexes them later
+            logger.error(f"Embedding {len(companies)} companies failed in bulk load {job.id}: {e}")
+            job.embedding_failures += len(companies)
+        finally:
+            slots.release()
@@ -1,8 +1,9 @@
 import os
 from urllib.parse import quote
+from ..connectors.http_client import get_session
 from ..models.models import DueDiligenceProfile
 import aiohttp
-from typing import Union
+from typing import Dict, List, Union
 import logging
 
 dd_host = os.getenv("DD_URL")
@@ -14,30 +15,28 @@ logger = logging.getLogger(__name__)
 async def start_dd_process(company_url: str) -> dict[str, str]:
     url = f"{base_url}/profile?company_name={quote(company_url, safe='')}"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url) as response:
-            if response.status != 200:
-                return {
-                    "status": "failed",
-                    "msg": f"failed to start DueDiligence for {company_url}",
-                }
-            return await response.json()
+    async with get_session().post(url) as response:
+        if response.status != 200:
+            return {
+                "status": "failed",
+                "msg": f"failed to start DueDiligence for {company_url}",
+            }
+        return await response.json()
 
 
 async def get_dd_profile_from_cache(company_url: str) -> Union['DueDiligenceProfile', dict[str, str]]:
     url = f"{base_url}/profile?company_name={quote(company_url, safe='')}"
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
+        async with get_session().get(url, timeout=10) as response:
 
-                if response.status != 200:
-                    logger.error(f"Failed Due Diligence API call for {company_url}")
-                    return None
+            if response.status != 200:
+                logger.error(f"Failed Due Diligence API call for {company_url}")
+                return None
                 
-                data = await response.json()
-                logger.info(f"Successfully retrieved DueDiligenceProfile for {company_url}")
-                return DueDiligenceProfile(**data)
+            data = await response.json()
+            logger.info(f"Successfully retrieved DueDiligenceProfile for {company_url}")
+            return DueDiligenceProfile(**data)
     
     except aiohttp.ClientConnectorError as e:
         logger.error(f"Could not connect to the Due Diligence API")
@@ -52,14 +51,50 @@ async def get_dd_profile_from_cache(company_url: str) -> Union['DueDiligenceProf
         return None
 
 
+async def get_dd_profiles_from_cache(company_urls: List[str]) -> Dict[str, DueDiligenceProfile]:
+    """Fetch the cached profiles of several companies in one call, keyed by url."""
+    if not company_urls:
+        return {}
+    url = f"{base_url}/profiles"
+
+    try:
+        async with get_session().post(url, json=list(company_urls), timeout=10) as response:
+
+            if response.status != 200:
+                logger.error(f"Failed bulk Due Diligence API call for {len(company_urls)} companies")
+                return {}
+
+            data = await response.json()
+            profiles = {}
+            for company_url, profile in data.items():
+                # A malformed profile leaves out its own company, not the whole batch
+                try:
+                    profiles[company_url] = DueDiligenceProfile(**profile)
+                except Exception as e:
+                    logger.error(f"Invalid due diligence profile for {company_url}: {e}")
+            return profiles
+
+    except aiohttp.ClientError:
+        logger.error(
+            "An aiohttp client error occurred in bulk due diligence API call "
+            f"for {len(company_urls)} companies"
+        )
+        return {}
+
+    except Exception:
+        logger.exception(
+            f"An unexpected error occurred calling bulk DD API for {len(company_urls)} companies."
+        )
+        return {}
+
+
 async def delete_dd_profile_from_cache(company_url: str) -> dict[str, str]:
     url = f"{base_url}/profile?company_name={quote(company_url, safe='')}"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.delete(url) as response:
-            if response.status != 200:
-                return {
-                    "status": "failed",
-                    "msg": f"failed to delete DueDiligence for {company_url} from cache",
-                }
-            return await response.json()
+    async with get_session().delete(url) as response:
+        if response.status != 200:
+            return {
+                "status": "failed",
+                "msg": f"failed to delete DueDiligence for {company_url} from cache",
+            }
+        return await response.json()
@@ -4,26 +4,39 @@ import json
 import logging
 import os
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from urllib.parse import urlparse
 from pydantic import ValidationError
-import aiohttp
-import docx2txt
 from fastapi import HTTPException
 from langchain_community.document_loaders.async_html import AsyncHtmlLoader
 from langchain_community.document_transformers.html2text import Html2TextTransformer
 from langchain_core.documents import Document
-from pypdf import PdfReader
-from src.connectors.postgres_conector import PostgresConnector
+from src.connectors.async_postgres_connector import AsyncPostgresConnector
+from src.connectors.http_client import get_session
+from src.connectors.postgres_listener import PostgresListener
 from src.models.models import Company, CompanyProfile, DueDiligenceProfile, DueDiligenceProfileInvalidError
+from ..services.text_extraction import DOCX_TYPE, PDF_TYPE, iter_text
 from ..services.vector_store_service import VectorStoreService
-from ..services.dd_service import get_dd_profile_from_cache
+from ..services.dd_service import get_dd_profile_from_cache, get_dd_profiles_from_cache
 
 
 vs = VectorStoreService(vector_store_name="company_vector_store")
+db = AsyncPostgresConnector()
+# Notified by the sites_status_notify trigger (backend/database/02-site-status-notify.sql)
+site_listener = PostgresListener("site_status", key="url")
+CRAWLER_TIMEOUT = int(os.getenv("CRAWLER_TIMEOUT", 900))
+CRAWLER_RECHECK_INTERVAL = int(os.getenv("CRAWLER_RECHECK_INTERVAL", 30))
 
 logger = logging.getLogger(__name__)
 
+# Must match the expression of companies_search_text_trgm_idx (backend/database/01-company-search.sql)
+COMPANY_SEARCH_TEXT = (
+    "companies_search_text(name, website, status, due_diligence_status, risk_level, country, "
+    "industry, subindustries, products_portfolio, service_portfolio, "
+    "specific_tools_and_technologies, specializations, quality_standards, company_size, "
+    "company_profile, description, verdict, contact_information)"
+)
+
 
 def get_text(document: bytes, file_type: str) -> str:
     """Get the text content from the document based on the file type.
@@ -40,24 +53,13 @@ def get_text(document: bytes, file_type: str) -> str:
     str
         The text content of the document
     """
-    if (
-        file_type
-        == "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    ):
-        return get_text_from_docx(document)
-    elif file_type == "application/pdf":
-        return get_text_from_pdf(document)
-    else:
-        return ""
+    return "".join(iter_text(io.BytesIO(document), file_type))
 
 
 def get_text_from_docx(document: bytes) -> str:
     """
     Extract text from a DOCX (Word) document provided as a bytes object.
 
-    This function reads a DOCX file from a bytes object, extracts the text using the docx2txt library,
-    and returns the extracted text. It handles DOCX files directly from memory using a BytesIO stream.
-
     Parameters
     ----------
     document : bytes
@@ -68,22 +70,13 @@ def get_text_from_docx(document: bytes) -> str:
     str
         Extracted text from the DOCX file or an empty string if extraction fails.
     """
-    try:
-        text = docx2txt.process(io.BytesIO(document))
-        logger.info("Successfully extracted text from DOCX document.")
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from DOCX document: {e}")
-        return ""
+    return get_text(document, DOCX_TYPE)
 
 
 def get_text_from_pdf(document: bytes) -> str:
     """
     Extract text from a PDF document provided as a bytes object.
 
-    Reads a PDF from bytes, extracts text from each page, and concatenates it into a single string.
-    Logs an error and returns an empty string if the text extraction fails.
-
     Parameters
     ----------
     document : bytes
@@ -94,16 +87,7 @@ def get_text_from_pdf(document: bytes) -> str:
     str
         Concatenated text from the PDF or an empty string if extraction fails.
     """
-    text = ""
-    try:
-        with io.BytesIO(document) as stream:
-            pdf_reader = PdfReader(stream)
-            for page in pdf_reader.pages:
-                if page.extract_text():
-                    text += page.extract_text()
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF document: {e}")
-    return text
+    return get_text(document, PDF_TYPE)
 
 
 def normalize_url(url):
@@ -153,17 +137,28 @@ def get_text_from_url(url: str) -> Optional[Document]:
         return None
 
 
+async def get_crawled_site_name(
+    website: str, source: AsyncPostgresConnector = db
+) -> Optional[str]:
+    """Return the name of a finished crawl of the website, or None if there is none yet."""
+    query = "SELECT name FROM sites WHERE url = %s AND status = 'done' LIMIT 1;"
+    result = await source.execute_query(query, (website,), fetchone=True)
+    return result["name"] if result else None
+
+
 async def get_text_from_crawler(
     website: str,
-    source: PostgresConnector = PostgresConnector(),
+    source: AsyncPostgresConnector = db,
 ) -> Optional[Document]:
     domain = normalize_url(website)
     host = os.getenv("CRAWLER_URL")
     port = os.getenv("CRAWLER_PORT")
     url = f"http://{host}:{port}/sites"
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
+    # Register before submitting, so the completion notification cannot be missed
+    completion = await site_listener.register(website)
+    try:
+        async with get_session().post(
             url, json=[{"website": website, "name": domain}]
         ) as response:
             if response.status != 204:
@@ -171,17 +166,31 @@ async def get_text_from_crawler(
                     status_code=400, detail="Failed to submit URL for crawling"
                 )
 
-        for _ in range(180):  # Check for 5 minutes (60 * 5 seconds)
-            async with session.get(f"http://{host}:{port}/sites") as response:
-                if response.status == 200:
-                    sites = await response.json()
-                    for site in sites:
-                        if site["Url"] == website and site["Status"] == "done":
-                            docs = source.get_document("raw_data", site["Name"])
-
-                            return docs
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + CRAWLER_TIMEOUT
+        while True:
+            # Also covers earlier crawls of the website and notifications lost on reconnects
+            name = await get_crawled_site_name(website, source)
+            if name:
+                return await source.get_document("raw_data", name)
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.error(f"Crawling {website} did not finish in {CRAWLER_TIMEOUT} seconds")
+                return None
+            try:
+                site = await asyncio.wait_for(
+                    asyncio.shield(completion), min(remaining, CRAWLER_RECHECK_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                continue
 
-            await asyncio.sleep(5)  # Wait for 5 seconds before checking again
+            if site["status"] != "done":
+                logger.error(f"Crawling {website} failed")
+                return None
+            return await source.get_document("raw_data", site["name"])
+    finally:
+        site_listener.unregister(website, completion)
 
 
 def build_company_model_from_company_profile(
@@ -223,64 +232,82 @@ def build_initial_company_model(
 
 
 async def set_company(
-    response: Company, source: PostgresConnector = PostgresConnector()
+    response: Company, source: AsyncPostgresConnector = db
 ):
     dump = response.model_dump()
     dump["Contact_Information"] = json.dumps(dump["Contact_Information"])
     if "id" in dump:
         del dump["id"]
-    docs = source.upload_document("companies", dump)
+    docs = await source.upload_document("companies", dump)
     return docs
 
 
+async def set_companies(
+    companies: List[Company], source: AsyncPostgresConnector = db
+) -> Dict[str, int]:
+    """Insert several companies with one multi-row INSERT.
+    Companies whose website already exists are skipped.
+    :return: The ids of the inserted companies, keyed by website."""
+    dumps = []
+    for company in companies:
+        dump = company.model_dump()
+        dump["Contact_Information"] = json.dumps(dump["Contact_Information"])
+        dump.pop("id", None)
+        dumps.append(dump)
+    rows = await source.upload_documents(
+        "companies", dumps, returning="id, website", conflict_column="website"
+    )
+    return {row["website"]: row["id"] for row in rows}
+
+
 async def update_company_verdict(
     company_id: int,
     verdict: str = "CONFIRMED",
-    source: PostgresConnector = PostgresConnector(),
+    source: AsyncPostgresConnector = db,
 ):
-    source.update_document("companies", company_id, {"verdict": verdict})
+    await source.update_document("companies", company_id, {"verdict": verdict})
     return await get_company(company_id, source)
 
 
 async def update_company_status(
-    company_id: int, status: str, source: PostgresConnector = PostgresConnector()
+    company_id: int, status: str, source: AsyncPostgresConnector = db
 ):
-    source.update_document("companies", company_id, {"status": status})
+    await source.update_document("companies", company_id, {"status": status})
     return await get_company(company_id, source)
 
 
 async def update_company(
-    company_id: int, profile: Company, source: PostgresConnector = PostgresConnector()
+    company_id: int, profile: Company, source: AsyncPostgresConnector = db
 ) -> Company | None:
     profile.Review_Date = datetime.now()
     data = profile.model_dump()
     data["Contact_Information"] = json.dumps(data["Contact_Information"])
-    source.update_document("companies", company_id, data)
+    await source.update_document("companies", company_id, data)
     company = await get_company(str(company_id))
     return company
 
 #TODO: fix the function - ad get company
 async def delete_company(
-    company_id: int, source: PostgresConnector = PostgresConnector()
+    company_id: int, source: AsyncPostgresConnector = db
 ):
     company = await get_company(company_id)
     if company is None:
         logger.error(f"Company with ID {company_id} does not exist.")
         return False
     # remove company from companies table
-    source.delete_document("companies", str(company_id))
+    await source.delete_document("companies", str(company_id))
     # remove company from sites table
     website = company.Website
     query = "DELETE FROM sites WHERE url = %s;"
-    source.execute_query(query, (website,))
+    await source.execute_query(query, (website,))
     vs.delete_document_in_vector_store(str(company_id), company)
     return True
 
 
 async def get_company(
-    document_id: str, source: PostgresConnector = PostgresConnector()
+    document_id: str, source: AsyncPostgresConnector = db
 ) -> Company | None:
-    doc = source.read_json_document("companies", document_id)
+    doc = await source.read_json_document("companies", document_id)
     if doc is None:
         return None
     try:
@@ -292,24 +319,35 @@ async def get_company(
 
 
 async def get_company_by_website(
-    website: str, source: PostgresConnector = PostgresConnector()
+    website: str, source: AsyncPostgresConnector = db
 ) -> Company | None:
     query = "SELECT * FROM companies WHERE website = %s;"
-    result = source.execute_query(query, (website,), fetchone=True)
+    result = await source.execute_query(query, (website,), fetchone=True)
     if not result:
         return None
     company = Company(**result)
     return company
 
 
+async def get_existing_websites(
+    websites: List[str], source: AsyncPostgresConnector = db
+) -> set[str]:
+    """Return the subset of websites that are already stored, with a single query."""
+    if not websites:
+        return set()
+    query = "SELECT website FROM companies WHERE website = ANY(%s);"
+    rows = await source.execute_query(query, (list(websites),), fetch=True)
+    return {row["website"] for row in rows or []}
+
+
 async def get_company_by_name(
-    name: str, source: PostgresConnector = PostgresConnector()
+    name: str, source: AsyncPostgresConnector = db
 ) -> Company | None:
     query = """
         SELECT * FROM companies
-        WHERE LOWER(name) ILIKE $1
+        WHERE LOWER(name) ILIKE %s
     """
-    result = source.execute_query(query, (name.lower(),), fetch=True)
+    result = await source.execute_query(query, (name.lower(),), fetch=True)
     if not result:
         return None
     companies = [Company(**doc) for doc in result]
@@ -317,13 +355,13 @@ async def get_company_by_name(
 
 
 async def company_exists(
-    website: str, source: PostgresConnector = PostgresConnector()
+    website: str, source: AsyncPostgresConnector = db
 ) -> bool:
     return await get_company_by_website(website, source) is not None
 
 
 async def query_companies(
-    source: PostgresConnector = PostgresConnector(),
+    source: AsyncPostgresConnector = db,
     query: Optional[str] = None,
     status: Optional[Union[str, List[str]]] = None,
     exclude_status: Optional[Union[str, List[str]]] = None,
@@ -332,15 +370,46 @@ async def query_companies(
     verdict: Optional[Union[str, List[str]]] = None,
     limit: Optional[int] = 100,
     offset: Optional[int] = 0,
+    last_id: Optional[int] = None,
+    with_total: bool = False,
+    ranked: bool = False,
+    with_rank: bool = False,
 ):
-    # Start with a basic SQL query
-    sql_query = "SELECT * FROM companies WHERE TRUE"
+    """
+    Query companies with free-text search and filters, newest first.
+
+    With ``with_total`` the result is a ``(companies, total)`` tuple, where the total
+    number of matching rows comes from a ``COUNT(*) OVER()`` window in the same statement.
+    ``last_id`` enables keyset pagination (``id < last_id``) for deep pages.
+    With ``ranked`` the free-text query uses the full-text and trigram indexes and the
+    results are ordered by relevance; ``last_id`` is ignored in that mode.
+    With ``with_rank`` the companies are returned as ``(company, relevance)`` pairs; the
+    relevance is None unless the query is ranked.
+    """
+    # Collect the filter conditions shared by the page and the count
+    filters = ""
     params = []
+    rank_column = ""
+    rank_params = []
+
+    if query and ranked:
+        # Whole-word matches through the tsvector index, substrings through the trigram index
+        filters += f"""
+            AND (
+                search_vector @@ websearch_to_tsquery('simple', %s) OR
+                {COMPANY_SEARCH_TEXT} LIKE %s
+            )
+        """
+        params = [query, f"%{query.lower()}%"]
+        rank_column = f""",
+            ts_rank(search_vector, websearch_to_tsquery('simple', %s)) +
+            word_similarity(%s, {COMPANY_SEARCH_TEXT}) AS rank"""
+        rank_params = [query, query.lower()]
 
     # If a general search query is provided, apply it to multiple fields
-    if query:
+    elif query:
         # Extended query
-        sql_query += """
+        filters += """
             AND (
                 LOWER(name) ILIKE %s OR
                 LOWER(website) ILIKE %s OR
@@ -372,51 +441,64 @@ async def query_companies(
     if status:
         if isinstance(status, list) and status:
             placeholders = ", ".join(["%s"] * len(status))
-            sql_query += f" AND status IN ({placeholders})"
+            filters += f" AND status IN ({placeholders})"
             params.extend(status)  # Make sure status is lowercased if needed
         else:
-            sql_query += " AND LOWER(status) = %s"
+            filters += " AND LOWER(status) = %s"
             params.append(status.lower())
 
     # Apply individual filters for excluding statuses
     if exclude_status:
         if isinstance(exclude_status, list) and exclude_status:
             placeholders = ", ".join(["%s"] * len(exclude_status))
-            sql_query += f" AND status NOT IN ({placeholders})"
+            filters += f" AND status NOT IN ({placeholders})"
             params.extend(exclude_status)
         else:
-            sql_query += " AND LOWER(status) != %s"
+            filters += " AND LOWER(status) != %s"
             params.append(exclude_status.lower())
 
     # Apply filters for industry
     if industry:
         if isinstance(industry, list) and industry:
             placeholders = ", ".join(["%s"] * len(industry))
-            sql_query += f" AND industry IN ({placeholders})"
+            filters += f" AND industry IN ({placeholders})"
             params.extend(industry)  # Make sure industry is lowercased if needed
         else:
-            sql_query += " AND LOWER(industry) = %s"
+            filters += " AND LOWER(industry) = %s"
             params.append(industry.lower())
 
     # Apply filters for country
     if country:
         if isinstance(country, list) and country:
             placeholders = ", ".join(["%s"] * len(country))
-            sql_query += f" AND country IN ({placeholders})"
+            filters += f" AND country IN ({placeholders})"
             params.extend(country)  # Make sure country is lowercased if needed
         else:
-            sql_query += " AND LOWER(country) = %s"
+            filters += " AND LOWER(country) = %s"
             params.append(country.lower())
     if verdict:
         if isinstance(verdict, list) and verdict:
             placeholders = ", ".join(["%s"] * len(verdict))
-            sql_query += f" AND verdict IN ({placeholders})"
+            filters += f" AND verdict IN ({placeholders})"
             params.extend(verdict)
         else:
-            sql_query += " AND verdict = %s"
+            filters += " AND verdict = %s"
             params.append(verdict)
 
-    sql_query += " ORDER BY id DESC"
+    filter_params = list(params)
+    params = rank_params + params
+    total_column = ", COUNT(*) OVER() AS total_count" if with_total else ""
+    sql_query = f"SELECT *{rank_column}{total_column} FROM companies WHERE TRUE {filters}"
+
+    # Keyset pagination must not narrow the window count, so filter outside it
+    if last_id is not None and not rank_column:
+        if with_total:
+            sql_query = f"SELECT * FROM ({sql_query}) AS filtered WHERE id < %s"
+        else:
+            sql_query += " AND id < %s"
+        params.append(last_id)
+
+    sql_query += " ORDER BY rank DESC, id DESC" if rank_column else " ORDER BY id DESC"
 
     if limit:
         sql_query += " LIMIT %s"
@@ -427,32 +509,156 @@ async def query_companies(
         params.append(offset)
 
     # Execute the query
-    result = source.execute_query(sql_query, params, fetch=True)
+    result = await source.execute_query(sql_query, params, fetch=True) or []
 
-    if not result:
-        return []
+    total = result[0]["total_count"] if result and with_total else 0
+
+    # A page past the end has no rows to carry the window count
+    if with_total and not result and (offset or (last_id is not None and not rank_column)):
+        count_query = f"SELECT COUNT(*) FROM companies WHERE TRUE {filters}"
+        count = await source.execute_query(count_query, filter_params, fetchone=True)
+        total = count["count"] if count else 0
 
     companies = [Company(**doc) for doc in result]
+    if with_rank:
+        companies = [(company, doc.get("rank")) for company, doc in zip(companies, result)]
 
+    if with_total:
+        return companies, total
     return companies
 
 
+async def get_companies_by_ids(
+    ids: List[int], source: AsyncPostgresConnector = db
+) -> Dict[int, Company]:
+    """Return the stored companies among the ids, keyed by id, with a single query."""
+    if not ids:
+        return {}
+    query = "SELECT * FROM companies WHERE id = ANY(%s);"
+    rows = await source.execute_query(query, (list(ids),), fetch=True)
+    return {row["id"]: Company(**row) for row in rows or []}
+
+
 async def get_companies_similarity_profiles(
-    metadata_list: List[dict],
-) -> List[Company]:
-    companies_list = []
-    for metadata in metadata_list:
-        company = await get_company_by_website(metadata["Website"])
-        companies_list.append(company)
-    return companies_list
+    metadata_list: List[dict], source: AsyncPostgresConnector = db
+) -> List[tuple[Company, float]]:
+    """Load the companies of vector search results with one query.
+    :param metadata_list: Results of query_vector_collection, best match first.
+    :return: Pairs of company and distance, in the order of the results.
+        Results whose company no longer exists are left out."""
+    ids = [int(metadata["Id"]) for metadata in metadata_list]
+    companies = await get_companies_by_ids(ids, source)
+    return [
+        (companies[id], metadata["Score"])
+        for id, metadata in zip(ids, metadata_list)
+        if id in companies
+    ]
+
+
+async def get_document_search(
+    content_hash: str, source: AsyncPostgresConnector = db
+) -> Optional[dict]:
+    """Return the stored document with this content hash."""
+    query = """
+        SELECT * FROM documents WHERE content_hash = %s;
+    """
+    return await source.execute_query(query, (content_hash,), fetchone=True)
+
+
+async def get_document_search_by_id(
+    document_id: int, source: AsyncPostgresConnector = db
+) -> Optional[dict]:
+    query = """
+        SELECT * FROM documents WHERE id = %s;
+    """
+    return await source.execute_query(query, (document_id,), fetchone=True)
+
+
+async def save_document_search(
+    file_name: str,
+    content_hash: str,
+    profile: str,
+    embedding: List[float],
+    source: AsyncPostgresConnector = db,
+) -> int:
+    """Store a processed document and return its id.
+    A document with the same content hash is overwritten."""
+    query = """
+        INSERT INTO documents
+            (file_name, status, content_hash, profile, embedding, processed_timestamp)
+        VALUES (%s, 'processed', %s, %s, %s, now())
+        ON CONFLICT (content_hash) DO UPDATE SET
+            profile = EXCLUDED.profile,
+            embedding = EXCLUDED.embedding,
+            processed_timestamp = EXCLUDED.processed_timestamp
+        RETURNING id;
+    """
+    result = await source.execute_query(
+        query, (file_name, content_hash, profile, embedding), fetchone=True
+    )
+    return result["id"]
+
+
+async def set_document_matches(
+    document_id: int,
+    matches: List[tuple[int, float]],
+    exhausted: bool,
+    source: AsyncPostgresConnector = db,
+) -> None:
+    """Replace the matched companies of a document.
+    :param matches: Pairs of company id and distance, best match first.
+    :param exhausted: Whether the search returned every company it could."""
+    async with source.transaction() as cur:
+        await cur.execute(
+            "DELETE FROM document_suitable_companies WHERE document_id = %s;", (document_id,)
+        )
+        await cur.execute(
+            """
+            UPDATE documents SET search_results = %s, search_exhausted = %s
+            WHERE id = %s;
+            """,
+            (len(matches), exhausted, document_id),
+        )
+        if matches:
+            # companies deleted since the index was built are skipped
+            await cur.executemany(
+                """
+                INSERT INTO document_suitable_companies (document_id, company_id, distance, rank)
+                SELECT %s, id, %s, %s FROM companies WHERE id = %s;
+                """,
+                [
+                    (document_id, distance, rank, company_id)
+                    for rank, (company_id, distance) in enumerate(matches)
+                ],
+            )
+
+
+async def get_document_matches(
+    document_id: int, offset: int = 0, limit: int = 10, source: AsyncPostgresConnector = db
+) -> List[tuple[Company, float]]:
+    """Return a page of the matched companies of a document with their distances."""
+    query = """
+        SELECT c.*, m.distance AS match_distance
+        FROM document_suitable_companies m
+        JOIN companies c ON c.id = m.company_id
+        WHERE m.document_id = %s
+        ORDER BY m.rank
+        LIMIT %s OFFSET %s;
+    """
+    rows = await source.execute_query(query, (document_id, limit, offset), fetch=True)
+    matches = []
+    for row in rows or []:
+        distance = row.pop("match_distance")
+        matches.append((Company(**row), distance))
+    return matches
 
 
 async def get_due_diligence_by_website_db(
-    url: str, source: PostgresConnector = PostgresConnector()
+    url: str, source: AsyncPostgresConnector = db
 ) -> DueDiligenceProfile | None:
     
     query = "SELECT * FROM due_diligence_profiles WHERE url = %s;"
-    dd_data = source.execute_query(query, (url,), fetchone=True)
+    dd_data = await source.execute_query(query, (url,), fetchone=True)
     if not dd_data:
         return None 
     try:
@@ -475,8 +681,38 @@ async def get_due_diligence_status(
     return None
 
 
+async def get_due_diligence_by_websites_db(
+    urls: List[str], source: AsyncPostgresConnector = db
+) -> Dict[str, DueDiligenceProfile]:
+    """Load the saved profiles of several websites with a single query, keyed by url."""
+    if not urls:
+        return {}
+    query = "SELECT * FROM due_diligence_profiles WHERE url = ANY(%s);"
+    rows = await source.execute_query(query, (list(urls),), fetch=True)
+    profiles = {}
+    for row in rows or []:
+        try:
+            profiles[row["url"]] = DueDiligenceProfile(**row)
+        except ValidationError as e:
+            logger.error(f"Invalid due diligence profile for {row['url']}: {e}")
+    return profiles
+
+
+async def get_due_diligence_statuses(
+        urls: List[str]
+        ) -> Dict[str, DueDiligenceProfile]:
+    """Resolve due diligence profiles for a list of websites: saved profiles first,
+    then one batched cache call for the remaining ones."""
+    urls = list(dict.fromkeys(url for url in urls if url))
+    profiles = await get_due_diligence_by_websites_db(urls)
+    missing = [url for url in urls if url not in profiles]
+    if missing:
+        profiles.update(await get_dd_profiles_from_cache(missing))
+    return profiles
+
+
 async def update_due_diligence_profile(
-    dd_profile: DueDiligenceProfile, source: PostgresConnector = PostgresConnector()
+    dd_profile: DueDiligenceProfile, source: AsyncPostgresConnector = db
 ) -> dict[str, str]:
     
     if dd_profile.status == "running":
@@ -503,13 +739,13 @@ async def update_due_diligence_profile(
             raise HTTPException(status_code=400, detail="Error: Profile URL and ID do not match in database")
         #update the profile
         dump["id"] = old_profile.id #can be removed? 
-        source.update_document("due_diligence_profiles", dump["id"], dump)
+        await source.update_document("due_diligence_profiles", dump["id"], dump)
         return {"status": "ok", "msg": dump["id"]}
 
     #save new profile
     dump.pop("id", None)
     profile = stringify_json_fields(dump)
-    profile_id = source.upload_document("due_diligence_profiles", profile)
+    profile_id = await source.upload_document("due_diligence_profiles", profile)
     return {"status": "ok", "msg": profile_id}
 
 
@@ -521,22 +757,22 @@ def stringify_json_fields(data: dict) -> dict:
 
 
 async def delete_due_diligence_profile_db(
-    url: str, source: PostgresConnector = PostgresConnector()
+    url: str, source: AsyncPostgresConnector = db
 ):
     profile = await get_due_diligence_by_website_db(url)
     if profile:
-        source.delete_document("due_diligence_profiles", profile.id)
+        await source.delete_document("due_diligence_profiles", profile.id)
 
 
 async def get_last_n_profiles(
-    limit: int, source: PostgresConnector = PostgresConnector()
+    limit: int, source: AsyncPostgresConnector = db
 ):
-    docs = source.get_last_n_documents("companies", limit)
+    docs = await source.get_last_n_documents("companies", limit)
     companies = [Company(**doc) for doc in docs]
     return companies
 
 
-async def get_count_documents(source: PostgresConnector = PostgresConnector()):
-    count = source.count_documents("companies")
+async def get_count_documents(source: AsyncPostgresConnector = db):
+    count = await source.count_documents("companies")
 
     return count
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embedding vectors keyed by (model name, text hash): an in-process
+    LRU in front of a SQLite table that survives restarts.
+    """
+
+    def __init__(self, path: str, max_memory_items: int = 2048):
+        """
+        :param path: Path of the SQLite database file, created if it does not exist.
+        :param max_memory_items: Number of vectors kept in the in-process LRU tier.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+                """
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: tuple, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get_many(self, model: str, text_hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        Look up vectors, first in memory and then on disk.
+        :return: The cached vectors keyed by text hash; misses are left out.
+        """
+        found = {}
+        remaining = []
+        with self._lock:
+            for text_hash in dict.fromkeys(text_hashes):
+                vector = self._memory.get((model, text_hash))
+                if vector is None:
+                    remaining.append(text_hash)
+                    continue
+                self._memory.move_to_end((model, text_hash))
+                found[text_hash] = vector
+                self.memory_hits += 1
+
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(remaining), 500):
+            batch = remaining[start:start + 500]
+            placeholders = ", ".join(["?"] * len(batch))
+            rows = self._connection().execute(
+                f"SELECT text_hash, vector FROM embeddings "
+                f"WHERE model = ? AND text_hash IN ({placeholders})",
+                [model, *batch],
+            )
+            for text_hash, blob in rows:
+                vector = array("d", blob).tolist()
+                found[text_hash] = vector
+                self._remember((model, text_hash), vector)
+
+        disk_hits = sum(1 for text_hash in remaining if text_hash in found)
+        with self._lock:
+            self.disk_hits += disk_hits
+            self.misses += len(remaining) - disk_hits
+        return found
+
+    def set_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """
+        Store vectors keyed by text hash in both tiers.
+        """
+        for text_hash, vector in vectors.items():
+            self._remember((model, text_hash), vector)
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [
+                    (model, text_hash, array("d", vector).tobytes())
+                    for text_hash, vector in vectors.items()
+                ],
+            )
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and the hit rate over all lookups.
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self._memory),
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends texts missing from the EmbeddingCache to the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: Optional[str] = None):
+        """
+        :param embeddings: The underlying embedding model.
+        :param cache: The cache shared by all users of this model.
+        :param model: Model name used in the cache key; defaults to embeddings.model.
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        # Query and document embeddings may use different instructions, so cache them apart
+        self.query_model = f"{self.model}#query"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self.cache.text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model, hashes)
+        missing = {
+            text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in vectors
+        }
+        if missing:
+            embeddings = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, embeddings))
+            self.cache.set_many(self.model, computed)
+            vectors.update(computed)
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        text_hash = self.cache.text_hash(text)
+        vector = self.cache.get_many(self.query_model, [text_hash]).get(text_hash)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.set_many(self.query_model, {text_hash: vector})
+        return vector
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from ..models.models import Company
+from .document_service import get_companies_by_ids, query_companies, vs
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "company_profile_nomic"
+RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+# Latency budgets of the retrievers, in seconds; a retriever that exceeds it is left out
+LEXICAL_TIMEOUT = float(os.getenv("HYBRID_LEXICAL_TIMEOUT", 2))
+VECTOR_TIMEOUT = float(os.getenv("HYBRID_VECTOR_TIMEOUT", 5))
+MAX_CANDIDATES = int(os.getenv("HYBRID_MAX_CANDIDATES", 200))
+
+
+class HybridHit(BaseModel):
+    company: Company
+    score: float  # Reciprocal-rank fusion score, higher is better
+    lexical_rank: Optional[int] = None  # 1-based positions in each retriever's results
+    lexical_score: Optional[float] = None
+    vector_rank: Optional[int] = None
+    vector_distance: Optional[float] = None
+
+
+class RetrieverReport(BaseModel):
+    status: str  # ok, timeout or error
+    seconds: float
+    results: int = 0
+
+
+async def _timed(coroutine, timeout: float) -> Tuple[Optional[list], RetrieverReport]:
+    start = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(coroutine, timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        results, status = None, "timeout"
+    except Exception as e:
+        logger.error(f"Hybrid search retriever failed: {e}", exc_info=True)
+        results, status = None, "error"
+    report = RetrieverReport(
+        status=status,
+        seconds=time.perf_counter() - start,
+        results=len(results) if results is not None else 0,
+    )
+    return results, report
+
+
+def _matches(value: Optional[str], allowed: Optional[Union[str, List[str]]]) -> bool:
+    if not allowed:
+        return True
+    allowed = [allowed] if isinstance(allowed, str) else allowed
+    return (value or "").lower() in {item.lower() for item in allowed}
+
+
+async def hybrid_search(
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    status: Optional[Union[str, List[str]]] = None,
+    industry: Optional[Union[str, List[str]]] = None,
+    country: Optional[Union[str, List[str]]] = None,
+) -> Tuple[List[HybridHit], Optional[int], int, Dict[str, RetrieverReport]]:
+    """
+    Search companies with the ranked full-text query and the vector index at once,
+    and fuse both rankings with reciprocal-rank fusion: score = sum of 1 / (RRF_K + rank).
+    Each retriever returns up to offset + limit candidates (at most MAX_CANDIDATES) and
+    must answer within its latency budget, otherwise the other one is used alone.
+    :return: The requested page of hits; the number of companies matching the full-text
+        query, at most MAX_CANDIDATES (None if that retriever failed), which is the total
+        to paginate against;
+        the number of fused candidates the page was taken from; and a report of each
+        retriever.
+    """
+    depth = min(offset + limit, MAX_CANDIDATES)
+    (lexical, lexical_report), (vector, vector_report) = await asyncio.gather(
+        _timed(
+            query_companies(
+                query=query,
+                status=status,
+                industry=industry,
+                country=country,
+                limit=depth,
+                with_total=True,
+                ranked=True,
+                with_rank=True,
+            ),
+            LEXICAL_TIMEOUT,
+        ),
+        _timed(
+            # Chroma is synchronous; on timeout the thread finishes in the background
+            asyncio.to_thread(
+                vs.query_vector_collection,
+                query,
+                collection_name=COLLECTION_NAME,
+                k=depth,
+                industry=industry,
+                country=country,
+            ),
+            VECTOR_TIMEOUT,
+        ),
+    )
+
+    total = None
+    if lexical is not None:
+        lexical, total = lexical
+        # Pages beyond MAX_CANDIDATES are never searched, so they cannot be paginated to
+        total = min(total, MAX_CANDIDATES)
+        lexical_report.results = len(lexical)
+
+    hits: Dict[int, HybridHit] = {}
+    for rank, (company, relevance) in enumerate(lexical or [], start=1):
+        hits[company.id] = HybridHit(
+            company=company,
+            score=1 / (RRF_K + rank),
+            lexical_rank=rank,
+            lexical_score=relevance,
+        )
+
+    vector = vector or []
+    missing = [int(result["Id"]) for result in vector if int(result["Id"]) not in hits]
+    companies = await get_companies_by_ids(missing) if missing else {}
+    rank = 0
+    for result in vector:
+        id = int(result["Id"])
+        hit = hits.get(id)
+        if hit is None:
+            company = companies.get(id)
+            # The vector index has no status, so apply the filter here
+            if company is None or not _matches(company.Status, status):
+                continue
+            hit = hits[id] = HybridHit(company=company, score=0)
+        rank += 1
+        hit.score += 1 / (RRF_K + rank)
+        hit.vector_rank = rank
+        hit.vector_distance = result["Score"]
+
+    fused = sorted(hits.values(), key=lambda hit: (-hit.score, -hit.company.id))
+    reports = {"lexical": lexical_report, "vector": vector_report}
+    return fused[offset : offset + limit], total, len(fused), reports
@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+
+class CacheEntry(NamedTuple):
+    metadata: dict
+    content_hash: Optional[str] = None  # hash of the embedded text
+    metadata_hash: Optional[str] = None  # hash of the chunk metadata
+
+
+class IngestionCache:
+    """
+    Record of the documents ingested into a vector store, kept in a SQLite table
+    keyed by document id. Every upsert and delete is a single indexed statement in
+    its own transaction, and each thread uses its own connection, so concurrent
+    API requests cannot overwrite each other's entries.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the SQLite database file, created if it does not exist.
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingested_documents (
+                    doc_id TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    metadata_hash TEXT,
+                    metadata TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ingested_documents)")}
+            if "metadata_hash" not in columns:
+                conn.execute("ALTER TABLE ingested_documents ADD COLUMN metadata_hash TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __contains__(self, doc_id: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM ingested_documents WHERE doc_id = ?", (str(doc_id),)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM ingested_documents"
+        ).fetchone()[0]
+
+    def get(self, doc_id: str) -> Optional[CacheEntry]:
+        """
+        :return: The cache entry of the document, or None if it is not cached.
+        """
+        row = self._connection().execute(
+            "SELECT metadata, content_hash, metadata_hash FROM ingested_documents WHERE doc_id = ?",
+            (str(doc_id),),
+        ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(json.loads(row[0]), row[1], row[2])
+
+    def ids(self) -> Set[str]:
+        """
+        :return: The ids of all cached documents.
+        """
+        rows = self._connection().execute("SELECT doc_id FROM ingested_documents")
+        return {row[0] for row in rows}
+
+    def upsert(self, doc_id: str, entry: CacheEntry) -> None:
+        """
+        Insert or replace the entry of one document.
+        """
+        self.upsert_many({doc_id: entry})
+
+    def upsert_many(self, entries: Dict[str, CacheEntry]) -> None:
+        """
+        Insert or replace several entries in one transaction.
+        :param entries: Mapping of document id to its cache entry.
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            (str(doc_id), entry.content_hash, entry.metadata_hash, json.dumps(entry.metadata), now)
+            for doc_id, entry in entries.items()
+        ]
+        with self._connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO ingested_documents
+                    (doc_id, content_hash, metadata_hash, metadata, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(doc_id) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    metadata_hash = excluded.metadata_hash,
+                    metadata = excluded.metadata,
+                    updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+
+    def delete(self, doc_id: str) -> None:
+        """
+        Remove the entry of one document, if present.
+        """
+        self.delete_many([doc_id])
+
+    def delete_many(self, doc_ids: Iterable[str]) -> None:
+        """
+        Remove the entries of several documents in one transaction.
+        """
+        with self._connection() as conn:
+            conn.executemany(
+                "DELETE FROM ingested_documents WHERE doc_id = ?",
+                [(str(doc_id),) for doc_id in doc_ids],
+            )
+
+    def import_json(self, json_path: str) -> int:
+        """
+        One-time import of the legacy {vector_store_name}_cache.json file.
+        The file is renamed to *.imported afterwards so it is not imported twice.
+        Processes sharing the data directory may import it at the same time: the upsert
+        is idempotent, and a file renamed by another process counts as imported.
+        :return: The number of imported entries.
+        """
+        try:
+            with open(json_path, "r") as f:
+                cache_data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        self.upsert_many({doc_id: CacheEntry(metadata) for doc_id, metadata in cache_data.items()})
+        try:
+            os.replace(json_path, f"{json_path}.imported")
+        except FileNotFoundError:
+            pass
+        return len(cache_data)
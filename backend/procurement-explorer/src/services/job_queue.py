@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from typing import Awaitable, Callable, Dict, Optional
+
+from ..connectors.async_postgres_connector import AsyncPostgresConnector
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+class JobQueue:
+    """
+    Durable job queue on the job_queue table (backend/database/03-job-queue.sql).
+    Workers claim jobs with FOR UPDATE SKIP LOCKED, so several workers never run the
+    same job, and a job whose worker died is picked up again once its lock expires.
+    Running workers renew their lock with heartbeat, and only the worker holding the
+    lock can record the outcome of an attempt.
+    """
+
+    MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 30))
+    LOCK_TIMEOUT = float(os.getenv("JOB_LOCK_TIMEOUT", 1800))
+
+    def __init__(self, source: AsyncPostgresConnector):
+        self.source = source
+
+    async def enqueue(
+        self, kind: str, payload: dict, max_attempts: int = MAX_ATTEMPTS
+    ) -> int:
+        """
+        Add a job to the queue.
+        :param kind: Name of the handler that processes the job.
+        :param payload: JSON serializable arguments of the handler.
+        :return: The id of the job.
+        """
+        query = """
+            INSERT INTO job_queue (kind, payload, max_attempts)
+            VALUES (%s, %s, %s) RETURNING id;
+        """
+        result = await self.source.execute_query(
+            query, (kind, json.dumps(payload), max_attempts), fetchone=True
+        )
+        return result["id"]
+
+    async def get_job(self, job_id: int) -> Optional[dict]:
+        query = "SELECT * FROM job_queue WHERE id = %s;"
+        return await self.source.execute_query(query, (job_id,), fetchone=True)
+
+    async def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        Lock the next runnable job for a worker and start an attempt.
+        Jobs whose lock expired on their last attempt (the worker crashed or hung)
+        are marked as failed instead of being claimed again.
+        :return: The job, or None if no job is ready.
+        """
+        query = """
+            WITH expired AS (
+                UPDATE job_queue
+                SET status = 'failed',
+                    last_error = 'Lock expired on the last attempt',
+                    locked_by = NULL, locked_until = NULL, finished_at = now()
+                WHERE status = 'running' AND locked_until < now()
+                  AND attempts >= max_attempts
+            )
+            UPDATE job_queue
+            SET status = 'running',
+                attempts = attempts + 1,
+                locked_by = %s,
+                locked_until = now() + make_interval(secs => %s),
+                started_at = now()
+            WHERE id = (
+                SELECT id FROM job_queue
+                WHERE (status = 'queued' AND run_at <= now())
+                   OR (status = 'running' AND locked_until < now()
+                       AND attempts < max_attempts)
+                ORDER BY run_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *;
+        """
+        return await self.source.execute_query(
+            query, (worker_id, self.LOCK_TIMEOUT), fetchone=True
+        )
+
+    async def heartbeat(self, job: dict) -> bool:
+        """
+        Extend the lock of a running job by LOCK_TIMEOUT.
+        :return: False if the worker no longer holds the lock.
+        """
+        query = """
+            UPDATE job_queue
+            SET locked_until = now() + make_interval(secs => %s)
+            WHERE id = %s AND status = 'running' AND locked_by = %s
+            RETURNING id;
+        """
+        result = await self.source.execute_query(
+            query, (self.LOCK_TIMEOUT, job["id"], job["locked_by"]), fetchone=True
+        )
+        return result is not None
+
+    async def complete(self, job: dict, result: Optional[dict] = None) -> None:
+        query = """
+            UPDATE job_queue
+            SET status = 'done', result = %s, locked_by = NULL, locked_until = NULL,
+                finished_at = now()
+            WHERE id = %s AND locked_by = %s;
+        """
+        await self.source.execute_query(
+            query, (json.dumps(result), job["id"], job["locked_by"])
+        )
+
+    async def fail(self, job: dict, error: str) -> None:
+        """
+        Record a failed attempt. The job is retried with exponential backoff
+        until it has used up its attempts, then it is marked as failed.
+        Nothing is recorded if another worker has claimed the job since.
+        """
+        if job["attempts"] >= job["max_attempts"]:
+            query = """
+                UPDATE job_queue
+                SET status = 'failed', last_error = %s, locked_by = NULL, locked_until = NULL,
+                    finished_at = now()
+                WHERE id = %s AND locked_by = %s;
+            """
+            await self.source.execute_query(query, (error, job["id"], job["locked_by"]))
+            return
+
+        delay = self.RETRY_DELAY * 2 ** (job["attempts"] - 1)
+        query = """
+            UPDATE job_queue
+            SET status = 'queued', last_error = %s, locked_by = NULL, locked_until = NULL,
+                run_at = now() + make_interval(secs => %s)
+            WHERE id = %s AND locked_by = %s;
+        """
+        await self.source.execute_query(query, (error, delay, job["id"], job["locked_by"]))
+
+    async def stats(self) -> dict:
+        """
+        Return the queue depth per status, the age of the oldest waiting job and the
+        average latency (enqueue to finish) and run time of the jobs finished in the last hour.
+        """
+        query = """
+            SELECT
+                COUNT(*) FILTER (WHERE status = 'queued') AS queued,
+                COUNT(*) FILTER (WHERE status = 'queued' AND run_at <= now()) AS ready,
+                COUNT(*) FILTER (WHERE status = 'running') AS running,
+                COUNT(*) FILTER (WHERE status = 'done') AS done,
+                COUNT(*) FILTER (WHERE status = 'failed') AS failed,
+                COALESCE(EXTRACT(EPOCH FROM now() - MIN(created_at)
+                    FILTER (WHERE status = 'queued')), 0)::float AS oldest_queued_age,
+                COALESCE(AVG(EXTRACT(EPOCH FROM finished_at - created_at))
+                    FILTER (WHERE finished_at > now() - interval '1 hour'), 0)::float AS avg_latency,
+                COALESCE(AVG(EXTRACT(EPOCH FROM finished_at - started_at))
+                    FILTER (WHERE finished_at > now() - interval '1 hour'), 0)::float AS avg_run_time
+            FROM job_queue;
+        """
+        return await self.source.execute_query(query, fetchone=True)
+
+
+class JobWorker:
+    """
+    Runs the jobs of a JobQueue with a fixed number of concurrent slots.
+    Handlers are coroutines taking the job payload; an exception fails the attempt.
+    """
+
+    CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", 4))
+    POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+    # Renew the lock well before it expires
+    HEARTBEAT_INTERVAL = JobQueue.LOCK_TIMEOUT / 3
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: int = CONCURRENCY,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """
+        Stop claiming new jobs; running jobs are finished first.
+        """
+        self._stopping.set()
+
+    async def run(self) -> None:
+        logger.info(f"Worker {self.name} started with {self.concurrency} slots")
+        await asyncio.gather(
+            *(self._run_slot(f"{self.name}-{slot}") for slot in range(self.concurrency))
+        )
+        logger.info(f"Worker {self.name} stopped")
+
+    async def _run_slot(self, worker_id: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await self.queue.claim(worker_id)
+            except Exception as e:
+                logger.error(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _process(self, job: dict) -> None:
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            # Retrying cannot help, so use up the remaining attempts
+            await self.queue.fail(
+                {**job, "attempts": job["max_attempts"]}, f"Unknown job kind {job['kind']}"
+            )
+            return
+
+        logger.info(f"Running {job['kind']} job {job['id']}, attempt {job['attempts']}")
+        task = asyncio.create_task(handler(job["payload"]))
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await asyncio.wait({task, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # The worker is stopping
+            task.cancel()
+            raise
+        finally:
+            heartbeat.cancel()
+        if not task.done():
+            # The lock was lost and another worker may run the job, so stop this attempt
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            logger.warning(f"{job['kind']} job {job['id']} lost its lock, attempt abandoned")
+            return
+
+        try:
+            result = task.result()
+        except Exception as e:
+            logger.exception(f"{job['kind']} job {job['id']} failed")
+            await self.queue.fail(job, str(e))
+            return
+        await self.queue.complete(job, result)
+
+    async def _heartbeat(self, job: dict) -> None:
+        """
+        Renew the lock of a job while it runs; returns once the lock is lost.
+        """
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+            try:
+                if not await self.queue.heartbeat(job):
+                    return
+            except Exception as e:
+                logger.error(f"Renewing the lock of job {job['id']} failed: {e}")
@@ -0,0 +1,45 @@
+from typing import Dict
+
+from langchain_core.documents import Document
+
+from .document_service import (
+    build_company_model_from_company_profile,
+    get_text_from_crawler,
+    update_company,
+)
+from .job_queue import JobHandler
+from .llm.llm_service import new_generate_company_profile
+
+COMPANY_PROFILE_JOB = "company_profile"
+
+
+async def generate_company_profile(payload: dict) -> dict:
+    """
+    Crawl the website of a company added by url and store the generated profile.
+    :param payload: The id of the company and its url.
+    :raises RuntimeError: If crawling or profile generation fails, so the job is retried.
+    """
+    id, url = payload["id"], payload["url"]
+    url_text: Document | None = await get_text_from_crawler(str(url))
+    if url_text is None:
+        raise RuntimeError(f"Failed to extract text from {url}")
+
+    # Step 1: Generate company profile
+    response = await new_generate_company_profile(url_text)
+    if isinstance(response, dict):
+        raise RuntimeError(f"Failed to generate the company profile of {url}: {response}")
+
+    # Step 2: Build company object out of the company profile
+    company = build_company_model_from_company_profile(
+        url, response, status="Waiting for Review"
+    )
+    company.id = id
+    company.Status = "Waiting for Review"
+    company = await update_company(id, company)
+
+    return {"id": id, "status": company.Status}
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    COMPANY_PROFILE_JOB: generate_company_profile,
+}
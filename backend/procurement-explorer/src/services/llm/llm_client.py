@@ -1,18 +1,43 @@
+import asyncio
 import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import aiohttp
 from langchain_community.llms.ollama import Ollama
+from langchain_core.prompt_values import PromptValue
 from langchain_openai import OpenAI
+
+from ...connectors.http_client import get_session
+from .response_cache import LLMResponseCache
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 class LLMClient:
+    MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+    TIMEOUT = float(os.getenv("LLM_TIMEOUT", 300))
+    CONTEXT_SIZE = int(os.getenv("LLM_CONTEXT_SIZE", 2048))  # tokens of prompt and response
+    CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    CACHE = LLMResponseCache(
+        str(Path(__file__).parent.parent.parent.parent / "data" / "llm_cache.sqlite3"),
+        ttl=float(os.getenv("LLM_CACHE_TTL", 30 * 24 * 3600)),
+        max_items=int(os.getenv("LLM_CACHE_SIZE", 10000)),
+    )
+
     def __init__(self):
         self.llm_type = os.getenv("LLM_TYPE", "ollama")  # Use Ollama as default
-        
+        # Created on first use, inside the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Generations in progress by cache key, so identical concurrent prompts run once
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
         if self.llm_type == "openai":
             if not OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY environment variable is not set.")
             self.llm = OpenAI(
                 model_name=os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-instruct"),
-                api_key=os.getenv("OPENAI_API_KEY")
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=self.TIMEOUT,
             )
         else:
             ollama_url = os.getenv("OLLAMA_URL", "http://localhost")
@@ -22,11 +47,121 @@ class LLMClient:
                 temperature=0,
                 top_k=30,
                 top_p=0.1,
-                num_ctx=2048,
+                num_ctx=self.CONTEXT_SIZE,
                 base_url=f"http://{ollama_url}:{ollama_port}"
             )
 
-    def generate(self, prompt: str) -> str:
-        return self.llm(prompt)
+    def _model_and_options(self) -> Tuple[str, dict]:
+        """
+        The model name and the options that influence its output, used in the cache key.
+        """
+        if self.llm_type == "openai":
+            return self.llm.model_name, {
+                "temperature": self.llm.temperature,
+                "top_p": self.llm.top_p,
+                "max_tokens": self.llm.max_tokens,
+            }
+        return self.llm.model, {
+            "temperature": self.llm.temperature,
+            "top_k": self.llm.top_k,
+            "top_p": self.llm.top_p,
+            "num_ctx": self.llm.num_ctx,
+        }
+
+    def _cache_key(self, prompt: str, use_cache: bool) -> Optional[str]:
+        """
+        The cache key of the prompt, or None if the response must not be cached.
+        Only deterministic (temperature 0) generations are cached.
+        """
+        model, options = self._model_and_options()
+        if not (use_cache and self.CACHE_ENABLED and options["temperature"] == 0):
+            return None
+        return self.CACHE.key(model, options, prompt)
+
+    def generate(self, prompt: str, use_cache: bool = True) -> str:
+        """
+        :param use_cache: Set to False to bypass the response cache.
+        """
+        key = self._cache_key(str(prompt), use_cache)
+        if key is not None:
+            cached = self.CACHE.get(key)
+            if cached is not None:
+                return cached
+        response = self.llm(prompt)
+        if key is not None:
+            self.CACHE.set(key, self._model_and_options()[0], response)
+        return response
+
+    async def agenerate(self, prompt: Union[str, PromptValue], use_cache: bool = True) -> str:
+        """
+        Generate without blocking the event loop.
+        At most MAX_CONCURRENCY generations run at once, each limited to TIMEOUT seconds.
+        Deterministic responses are served from the response cache when possible.
+        :param use_cache: Set to False to bypass the response cache.
+        :raises asyncio.TimeoutError: If the generation takes longer than TIMEOUT.
+        :raises aiohttp.ClientResponseError: If Ollama answers with an error status.
+        """
+        if isinstance(prompt, PromptValue):
+            # Rendered prompt templates, when used in a chain
+            prompt = prompt.to_string()
+        key = self._cache_key(prompt, use_cache)
+        if key is None:
+            return await self._agenerate(prompt)
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            # Wait without propagating a cancellation of the other caller
+            await asyncio.wait([in_flight])
+            if not in_flight.cancelled():
+                return in_flight.result()
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            # SQLite calls run in a thread, so the cache never blocks the event loop
+            response = await asyncio.to_thread(self.CACHE.get, key)
+            if response is None:
+                response = await self._agenerate(prompt)
+                await asyncio.to_thread(
+                    self.CACHE.set, key, self._model_and_options()[0], response
+                )
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so it is not logged as never retrieved
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
 
+    async def _agenerate(self, prompt: str) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+        async with self._semaphore:
+            if self.llm_type == "openai":
+                # The OpenAI client keeps its own connection pool
+                return await self.llm.ainvoke(prompt)
+            return await self._ollama_generate(prompt)
 
+    async def _ollama_generate(self, prompt: str) -> str:
+        # Same request as the langchain Ollama class, sent over the shared keep-alive session
+        model, options = self._model_and_options()
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "options": options,
+        }
+        async with get_session().post(
+            f"{self.llm.base_url}/api/generate",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=self.TIMEOUT),
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+            return data["response"]
@@ -1,6 +1,19 @@
+import asyncio
 import base64
 import logging
-from typing import Union
+import os
+import time
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from langchain.prompts import PromptTemplate
 from langchain_core.documents import Document
@@ -22,41 +35,56 @@ logger = logging.getLogger(__name__)
 
 # Instantiate the LLM client based on environment configuration
 llm_client = LLMClient()
+# Chunks of a document profiled at once, best matched to OLLAMA_NUM_PARALLEL of the Ollama server
+DOCUMENT_PROFILE_CONCURRENCY = int(
+    os.getenv("DOCUMENT_PROFILE_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", 4))
+)
 
 
-def generate_document_profile(
-    document: str, chunk_size=5000
+async def generate_document_profile(
+    document: Union[str, Iterable[str]], chunk_size=5000, timings: Optional[dict] = None
 ) -> Union[DocumentProfile, dict]:
-    """Generate a response for a given document."""
+    """Generate a response for a given document.
+
+    The document is either its text or a stream of its pages, e.g. from text_extraction.
+    Chunks are profiled concurrently (map) as soon as the pages they come from are read,
+    then the chunk profiles are summarized, in several rounds if they do not fit into one
+    summary prompt (reduce).
+    If a timings dictionary is passed, the duration of each phase is added to it.
+    """
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, chunk_overlap=300
     )
-    docs = text_splitter.split_text(document)
-    num_of_chunks = len(docs)
+    pages = [document] if isinstance(document, str) else document
+    timings = timings if timings is not None else {}
+    tasks = []
 
     try:
-        response = ""
         prompt_template = PromptTemplate.from_template(
             template=DOCUMENT_PROFILE_TEMPLATE
         )
         output_parser = StrOutputParser()
-
-        for doc in docs:
-            # Format the prompt with the document chunk text
-            prompt_text = prompt_template.format(doc_text=doc)
-            # Pass the formatted prompt string to the LLM client
-            result = llm_client.generate(prompt_text)
-            parsed_result = output_parser.parse(result)
-            response += parsed_result
-
-            # If document is split into multiple chunks, summarize the chunks
-        if num_of_chunks > 1:
-            summary_prompt_template = PromptTemplate.from_template(
-                template=DOCUMENT_PROFILE_SUMMARY_TEMPLATE
-            )
-            summary_prompt_text = summary_prompt_template.format(doc_text=response)
-            response = llm_client.generate(summary_prompt_text)
-            response = output_parser.parse(response)
+        slots = asyncio.Semaphore(DOCUMENT_PROFILE_CONCURRENCY)
+
+        async def generate(prompt_text: str) -> str:
+            async with slots:
+                return output_parser.parse(await llm_client.agenerate(prompt_text))
+
+        # Extraction runs in a thread, overlapping with the generation of earlier chunks
+        start = time.perf_counter()
+        async for doc in _iterate_in_thread(_split_pages(pages, text_splitter, chunk_size)):
+            tasks.append(asyncio.create_task(generate(prompt_template.format(doc_text=doc))))
+        profiles = await asyncio.gather(*tasks)
+        timings["map"] = {"seconds": time.perf_counter() - start, "calls": len(tasks)}
+
+        # If document is split into multiple chunks, summarize the chunks
+        start = time.perf_counter()
+        response, rounds, calls = await _reduce_document_profiles(list(profiles), generate)
+        timings["reduce"] = {
+            "seconds": time.perf_counter() - start,
+            "calls": calls,
+            "rounds": rounds,
+        }
 
     except ValidationError as ve:
         logger.error(f"Validation error when creating DocumentProfile: {ve}")
@@ -64,19 +92,100 @@ def generate_document_profile(
     except Exception as e:
         logger.error(f"Error generating document profile: {e}")
         return {"error": "Error generating document profile", "details": str(e)}
+    finally:
+        for task in tasks:
+            task.cancel()
 
     return str(response)  # parsed_response #document_profile
 
 
-def generate_company_profile(
+def _split_pages(
+    pages: Iterable[str], text_splitter: RecursiveCharacterTextSplitter, chunk_size: int
+) -> Iterator[str]:
+    """Split a stream of pages into chunks, holding only a few chunks of text at a time.
+    The last chunk of each split is carried over, so chunks do not end at page breaks."""
+    buffer = ""
+    for page in pages:
+        buffer += page
+        if len(buffer) >= 4 * chunk_size:
+            chunks = text_splitter.split_text(buffer)
+            last = chunks.pop() if chunks else ""
+            # Carry over the raw text from the last chunk on, chunks are stripped of whitespace
+            start = buffer.rfind(last)
+            buffer = buffer[start:] if last and start >= 0 else last
+            yield from chunks
+    if buffer:
+        yield from text_splitter.split_text(buffer)
+
+
+async def _iterate_in_thread(iterator: Iterator[str]) -> AsyncIterator[str]:
+    """Consume a blocking iterator item by item in a worker thread."""
+    done = object()
+    while (item := await asyncio.to_thread(next, iterator, done)) is not done:
+        yield item
+
+
+def _pack(profiles: List[str], max_chars: int) -> List[List[str]]:
+    """Pack consecutive profiles into groups of at most max_chars, joined by new lines."""
+    groups: List[List[str]] = []
+    size = 0
+    for profile in profiles:
+        if groups and size + 1 + len(profile) <= max_chars:
+            groups[-1].append(profile)
+            size += 1 + len(profile)
+        else:
+            groups.append([profile])
+            size = len(profile)
+    return groups
+
+
+async def _reduce_document_profiles(
+    profiles: List[str], generate: Callable[[str], Awaitable[str]]
+) -> Tuple[str, int, int]:
+    """Summarize chunk profiles into one profile, never exceeding the context size.
+
+    Profiles are packed into groups that fit into one summary prompt, and every group
+    is summarized concurrently, until a single profile is left.
+    :return: The profile, the number of rounds and the number of summary calls.
+    """
+    summary_prompt_template = PromptTemplate.from_template(
+        template=DOCUMENT_PROFILE_SUMMARY_TEMPLATE
+    )
+    # About 4 characters per token; half of the context is left for the response
+    max_chars = (
+        llm_client.CONTEXT_SIZE * 4 // 2 - len(DOCUMENT_PROFILE_SUMMARY_TEMPLATE)
+    )
+    rounds = calls = 0
+    while len(profiles) > 1:
+        # The prompt of a single profile must fit as well
+        profiles = [profile[:max_chars] for profile in profiles]
+        groups = _pack(profiles, max_chars)
+        if len(groups) == len(profiles):
+            # No two profiles fit together, shorten them so the round makes progress
+            groups = _pack([profile[: (max_chars - 1) // 2] for profile in profiles], max_chars)
+
+        profiles = list(
+            await asyncio.gather(
+                *(
+                    generate(summary_prompt_template.format(doc_text="\n".join(group)))
+                    for group in groups
+                )
+            )
+        )
+        rounds += 1
+        calls += len(groups)
+    return (profiles[0] if profiles else ""), rounds, calls
+
+
+async def generate_company_profile(
     document: Document, chunk_size=7000
 ) -> Union[CompanyProfile, dict]:
     try:
         prompt = PromptTemplate.from_template(template=COMPANY_PROFILE_TEMPLATE)
-        chain = prompt | llm_client.generate | StrOutputParser()
+        chain = prompt | llm_client.agenerate | StrOutputParser()
 
         # Only process the first 7000 characters if the document is too long
-        response = chain.invoke({"website_text": document.page_content[:chunk_size]})
+        response = await chain.ainvoke({"website_text": document.page_content[:chunk_size]})
 
         # Parse the response into the company profile
         parsed_response = parse_company_profile(response)
@@ -94,7 +203,7 @@ def generate_company_profile(
         return {"error": "Error generating company profile", "details": str(e)}
 
 
-def new_generate_company_profile(
+async def new_generate_company_profile(
     document: Document, chunk_size=1000
 ) -> Union[CompanyProfile, dict]:
     try:
@@ -118,7 +227,7 @@ def new_generate_company_profile(
         prompt_value = prompt.format(website_text=data_decoded[:chunk_size])
 
         # Ensure you are passing a list of strings (as required by LLM)
-        response = llm_client.generate(prompt_value)
+        response = await llm_client.agenerate(prompt_value)
 
         # response = chain.invoke({"website_text": data_decoded})
 
@@ -138,7 +247,7 @@ def new_generate_company_profile(
         return {"error": "Error generating company profile", "details": str(e)}
 
 
-def generate_full_company_profile(
+async def generate_full_company_profile(
     website_content, max_words=12000, additional_info: dict = {}
 ):
     """
@@ -146,13 +255,13 @@ def generate_full_company_profile(
     This function is used by the summarize_profiles.py script.
     """
     prompt = PromptTemplate.from_template(template=COMPANY_PROFILE_TEMPLATE)
-    chain = prompt | llm_client.generate | StrOutputParser()
+    chain = prompt | llm_client.agenerate | StrOutputParser()
     responses = ""
 
     for index, doc in enumerate(website_content):
         print(f"Processing chunk {index + 1} of {len(website_content)}")
         print(f"Text length: {len(doc.page_content)}")
-        response = chain.invoke({"website_text": doc.page_content})
+        response = await chain.ainvoke({"website_text": doc.page_content})
         responses += "\n====================\n"  # Add ===== to separate the responses
         responses += response
         if len(responses) > max_words:
@@ -161,8 +270,8 @@ def generate_full_company_profile(
     summary_prompt = PromptTemplate.from_template(
         template=COMPANY_PROFILE_SUMMARY_TEMPLATE
     )
-    chain = summary_prompt | llm_client.generate | StrOutputParser()
-    response = chain.invoke(
+    chain = summary_prompt | llm_client.agenerate | StrOutputParser()
+    response = await chain.ainvoke(
         {"context": responses, "additional_context": str(additional_info)}
     )
 
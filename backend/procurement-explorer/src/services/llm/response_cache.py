@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class LLMResponseCache:
+    """
+    Persistent cache of LLM responses in a SQLite table, keyed by a hash of the model,
+    its generation options and the prompt. Entries expire after `ttl` seconds. Once there
+    are more than `max_items`, expired and then least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, ttl: float = 30 * 24 * 3600, max_items: int = 10000):
+        """
+        :param path: Path of the SQLite database file, created if it does not exist.
+        :param ttl: Seconds an entry stays valid; 0 disables expiry.
+        :param max_items: Maximum number of cached responses.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_responses_last_used_idx "
+                "ON llm_responses (last_used_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(model: str, options: dict, prompt: str) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                {"model": model, "options": options, "prompt": prompt}, sort_keys=True
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        :return: The cached response, or None if it is missing or expired.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute(
+                    "UPDATE llm_responses SET last_used_at = ? WHERE key = ?", (now, key)
+                )
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def set(self, key: str, model: str, response: str) -> None:
+        """
+        Store a response, evicting entries only if the cache is over max_items.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses "
+                "(key, model, response, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            items = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            if items <= self.max_items:
+                return
+            if self.ttl:
+                conn.execute(
+                    "DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl,)
+                )
+            conn.execute(
+                """
+                DELETE FROM llm_responses WHERE key IN (
+                    SELECT key FROM llm_responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_items,),
+            )
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters, the hit rate and the number of cached responses.
+        """
+        items = self._connection().execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "items": items,
+            }
@@ -2,7 +2,7 @@ from ..connectors.postgres_conector import PostgresConnector
 
 class SanctionsChecker:
     def __init__(self):
-        self.db = PostgresConnector()
+        self.db = PostgresConnector(pooled=True)
 
     def check_us_sanctions(self, field, value):
         query = f"""
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional
+from xml.etree import ElementTree
+
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+PDF_TYPE = "application/pdf"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+MAX_BYTES = int(os.getenv("EXTRACTION_MAX_BYTES", 50 * 1024 * 1024))
+MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", 500))
+# PDFs with at least this many pages are extracted by a process pool
+PARALLEL_MIN_PAGES = int(os.getenv("EXTRACTION_PARALLEL_MIN_PAGES", 32))
+PAGES_PER_TASK = 8
+WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class DocumentTooLargeError(ValueError):
+    pass
+
+
+def content_hash(stream: BinaryIO, max_bytes: int = MAX_BYTES) -> str:
+    """
+    Hash a document in blocks, without reading it into memory at once.
+    :return: The sha256 hex digest; the position is reset to the start.
+    :raises DocumentTooLargeError: If the stream is larger than max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while block := stream.read(1024 * 1024):
+        size += len(block)
+        if size > max_bytes:
+            raise DocumentTooLargeError(f"Document is larger than the limit of {max_bytes} bytes")
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def detect_file_type(stream: BinaryIO) -> Optional[str]:
+    """
+    Detect the type of a document from its content, since uploads often carry a generic
+    content type such as application/octet-stream.
+    :return: PDF_TYPE, DOCX_TYPE, or None for any other content; the position is reset
+        to the start.
+    """
+    stream.seek(0)
+    header = stream.read(5)
+    stream.seek(0)
+    if header.startswith(b"%PDF"):
+        return PDF_TYPE
+    if header.startswith(b"PK"):
+        try:
+            with zipfile.ZipFile(stream) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return DOCX_TYPE
+        except zipfile.BadZipFile:
+            pass
+        finally:
+            stream.seek(0)
+    return None
+
+
+def iter_text(stream: BinaryIO, file_type: str, max_pages: int = MAX_PAGES) -> Iterator[str]:
+    """
+    Yield the text of a document page by page (PDF) or paragraph by paragraph (DOCX).
+    Unknown file types yield nothing, and extraction errors are logged and end the stream.
+    :param stream: The document, opened in binary mode and seekable.
+    :param file_type: The MIME type of the document.
+    :param max_pages: PDF pages after this many are skipped.
+    """
+    try:
+        if file_type == DOCX_TYPE:
+            yield from iter_docx_paragraphs(stream)
+        elif file_type == PDF_TYPE:
+            yield from iter_pdf_pages(stream, max_pages)
+    except Exception as e:
+        logger.error(f"Error extracting text from {file_type} document: {e}")
+
+
+def iter_pdf_pages(stream: BinaryIO, max_pages: int = MAX_PAGES) -> Iterator[str]:
+    """
+    Yield the text of each page of a PDF, extracting every page once.
+    Large PDFs are spooled to a temporary file and extracted by a process pool,
+    in page order.
+    """
+    reader = PdfReader(stream)
+    num_pages = len(reader.pages)
+    if num_pages > max_pages:
+        logger.warning(f"PDF has {num_pages} pages, only the first {max_pages} are extracted")
+        num_pages = max_pages
+
+    if num_pages < PARALLEL_MIN_PAGES or WORKERS < 2:
+        yield from _extract_pdf_pages(reader, 0, num_pages)
+        return
+
+    stream.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as copy:
+        shutil.copyfileobj(stream, copy)
+        copy.flush()
+        ranges = [
+            (copy.name, start, min(start + PAGES_PER_TASK, num_pages))
+            for start in range(0, num_pages, PAGES_PER_TASK)
+        ]
+        # map returns the results in submission order, as soon as each one is ready
+        for pages in _get_executor().map(_extract_pdf_page_range, *zip(*ranges)):
+            yield from pages
+
+
+def _extract_pdf_pages(reader: PdfReader, start: int, end: int) -> Iterator[str]:
+    for page in reader.pages[start:end]:
+        text = page.extract_text()
+        if text:
+            yield text
+
+
+def _extract_pdf_page_range(path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process
+    with open(path, "rb") as stream:
+        return list(_extract_pdf_pages(PdfReader(stream), start, end))
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=WORKERS)
+    return _executor
+
+
+def iter_docx_paragraphs(stream: BinaryIO) -> Iterator[str]:
+    """
+    Yield the paragraphs of a DOCX document: headers, body, then footers.
+    The XML parts are parsed incrementally instead of being loaded at once.
+    """
+    with zipfile.ZipFile(stream) as archive:
+        names = archive.namelist()
+        parts = (
+            sorted(name for name in names if name.startswith("word/header"))
+            + ["word/document.xml"]
+            + sorted(name for name in names if name.startswith("word/footer"))
+        )
+        for part in parts:
+            if part not in names:
+                continue
+            with archive.open(part) as xml:
+                yield from _iter_paragraphs(xml)
+
+
+def _iter_paragraphs(xml: BinaryIO) -> Iterator[str]:
+    texts = []
+    for event, element in ElementTree.iterparse(xml, events=("end",)):
+        if element.tag == f"{WORD_NAMESPACE}t" and element.text:
+            texts.append(element.text)
+        elif element.tag == f"{WORD_NAMESPACE}tab":
+            texts.append("\t")
+        elif element.tag in (f"{WORD_NAMESPACE}br", f"{WORD_NAMESPACE}cr"):
+            texts.append("\n")
+        elif element.tag == f"{WORD_NAMESPACE}p":
+            if texts:
+                yield "".join(texts) + "\n"
+            texts = []
+            # The paragraph is consumed, free its subtree
+            element.clear()
@@ -1,25 +1,39 @@
+import hashlib
 import json
 import os
+import time
 import uuid
 from pathlib import Path
-from typing import Any, List, Literal, Tuple
+from typing import List, Literal, Optional, Tuple, Union
 
 import chromadb
 from chromadb import QueryResult
 from langchain_community.embeddings.ollama import OllamaEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from ..connectors.postgres_conector import PostgresConnector
 from ..models.models import Company
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .ingestion_cache import CacheEntry, IngestionCache
 
 
 class VectorStoreService:
     OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost")
     OLLAMA_PORT = os.getenv("OLLAMA_PORT", "11434")
     PERSISTENT_DIR_PATH = Path(__file__).parent.parent.parent / "data"
-    DEFAULT_EMBEDDING_MODEL = OllamaEmbeddings(
-        model=os.getenv("EMBEDDING_MODEL", "mxbai-embed-large"),
-        base_url=f"http://{OLLAMA_URL}:{OLLAMA_PORT}",
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    AGGREGATE_CHUNKS = 3  # Closest chunks averaged into the company score of a query
+    EMBEDDING_CACHE = EmbeddingCache(
+        str(PERSISTENT_DIR_PATH / "embedding_cache.sqlite3"),
+        max_memory_items=int(os.getenv("EMBEDDING_CACHE_SIZE", 2048)),
+    )
+    DEFAULT_EMBEDDING_MODEL = CachedEmbeddings(
+        OllamaEmbeddings(
+            model=os.getenv("EMBEDDING_MODEL", "mxbai-embed-large"),
+            base_url=f"http://{OLLAMA_URL}:{OLLAMA_PORT}",
+        ),
+        EMBEDDING_CACHE,
     )
 
     def __init__(
@@ -36,26 +50,21 @@ class VectorStoreService:
         self.persistent_client = chromadb.PersistentClient(
             path=f"{persistent_dir}/{vector_store_name}"
         )
+        self.cache = IngestionCache(f"{persistent_dir}/{vector_store_name}_cache.sqlite3")
+        self.cache.import_json(f"{persistent_dir}/{vector_store_name}_cache.json")
 
-    def _read_cache(self) -> dict[str, Any]:
-        """
-        Read the cache.
-        """
-        if os.path.exists(f"{self.persistent_dir}/{self.vector_store_name}_cache.json"):
-            with open(
-                f"{self.persistent_dir}/{self.vector_store_name}_cache.json", "r"
-            ) as f:
-                return json.load(f)
-        return {}
-
-    def _write_cache(self, cache_data: dict[str, Any]):
+    @staticmethod
+    def _hash(value) -> str:
+        return hashlib.sha256(
+            json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _cache_entry(self, blob: str, profile: dict) -> CacheEntry:
         """
-        Write the cache.
+        Cache entry of a document, with separate hashes of the embedded text and the metadata.
         """
-        with open(
-            f"{self.persistent_dir}/{self.vector_store_name}_cache.json", "w"
-        ) as f:
-            json.dump(cache_data, f)
+        metadata, texts_to_embed = self._process_json_blob(blob, profile)
+        return CacheEntry(metadata, self._hash(texts_to_embed), self._hash(metadata))
 
     def add_document_to_collection(
         self,
@@ -63,70 +72,138 @@ class VectorStoreService:
         embedding_splitter: RecursiveCharacterTextSplitter,
         blob: str,
         profile: dict[str, str],
-        embedding_model: OllamaEmbeddings = DEFAULT_EMBEDDING_MODEL,
+        embedding_model: Embeddings = DEFAULT_EMBEDDING_MODEL,
     ) -> None:
         """
         Add a document to a collection.
         """
-        metadata, texts_to_embed = self._process_json_blob(blob, profile)
-        # Split to chunks of 512 tokens
-        chunks = embedding_splitter.create_documents(texts_to_embed)
-        # Get the embeddings
-        embeddings = embedding_model.embed_documents(
-            [str(chunk.page_content) for chunk in chunks]
+        metadatas = self.add_documents_to_collection(
+            collection, embedding_splitter, [(blob, profile)], embedding_model
         )
-        for id, chunk in enumerate(chunks):
+        return metadatas[blob]
+
+    def add_documents_to_collection(
+        self,
+        collection: chromadb.Collection,
+        embedding_splitter: RecursiveCharacterTextSplitter,
+        documents: List[Tuple[str, dict]],
+        embedding_model: Embeddings = DEFAULT_EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ) -> dict[str, dict]:
+        """
+        Add several documents to a collection.
+        Chunks of all documents are embedded and written together, batch_size chunks at a time.
+        """
+        metadatas = {}
+        ids, texts, chunk_metadatas = [], [], []
+        for blob, profile in documents:
+            metadata, texts_to_embed = self._process_json_blob(blob, profile)
+            metadatas[blob] = metadata
+            # Split to chunks of 512 tokens
+            for chunk in embedding_splitter.create_documents(texts_to_embed):
+                ids.append(str(uuid.uuid4()))
+                texts.append(str(chunk.page_content))
+                chunk_metadatas.append(metadata)
+
+        batch_size = min(batch_size, self.persistent_client.get_max_batch_size())
+        for start in range(0, len(texts), batch_size):
+            end = start + batch_size
             collection.add(
-                ids=str(uuid.uuid4()),
-                documents=chunk.page_content,
-                embeddings=embeddings[id],
-                metadatas=metadata,
+                ids=ids[start:end],
+                documents=texts[start:end],
+                embeddings=embedding_model.embed_documents(texts[start:end]),
+                metadatas=chunk_metadatas[start:end],
             )
-        return metadata
+        return metadatas
+
+    @staticmethod
+    def _normalize_profile(profile: dict) -> dict[str, str]:
+        """
+        Lowercase the keys and convert the values to strings, so a company read from the
+        database and a Company model give the same metadata, texts and hashes.
+        """
+        normalized = dict[str, str]()
+        for key, value in profile.items():
+            if value is None:
+                value = ""
+            elif isinstance(value, list):
+                value = ", ".join(str(item) for item in value)
+            normalized[key.lower()] = str(value)
+        return normalized
 
     def _get_company_dict(self, company: Company) -> dict[str, str]:
-        company_dict = dict[str, str]()
-        company_dump = company.model_dump()
-        for key in company_dump:
-            company_dict[key.lower()] = str(company_dump[key])
-        return company_dict
+        return self._normalize_profile(company.model_dump())
 
     def update_document_in_vector_store(self, id: str, company: Company) -> None:
+        """
+        Re-index a company only as far as it changed: nothing if neither the embedded
+        text nor the metadata changed, an in-place metadata update if only the metadata
+        changed, and a full re-embedding otherwise.
+        """
+        entry = self._cache_entry(id, self._get_company_dict(company))
+        cached = self.cache.get(id)
+        if cached is not None and cached.content_hash == entry.content_hash:
+            if cached.metadata_hash != entry.metadata_hash:
+                collection = self.get_collection("company_profile_nomic")
+                self._update_metadata_in_collection(collection, id, entry.metadata)
+                self.cache.upsert(id, entry)
+            return
         self.delete_document_in_vector_store(id, company)
         self.add_document_to_vector_store(id, company)
 
+    def _update_metadata_in_collection(
+        self, collection: chromadb.Collection, id: str, metadata: dict
+    ) -> None:
+        """
+        Replace the metadata of all chunks of a document without re-embedding them.
+        Chroma merges updated metadata into the stored one, so keys missing from the
+        new metadata are set to None, which removes them.
+        """
+        chunks = collection.get(where={"id": id}, include=["metadatas"])
+        if chunks["ids"]:
+            collection.update(
+                ids=chunks["ids"],
+                metadatas=[
+                    {**{key: None for key in stored or {}}, **metadata}
+                    for stored in chunks["metadatas"]
+                ],
+            )
+
     def delete_document_in_vector_store(self, id: str, company: Company) -> None:
         collection = self.get_collection("company_profile_nomic")
 
         company_dict = self._get_company_dict(company)
         assert "name" in company_dict
 
-        collection.delete(where={"name": company_dict["name"]})
+        # Match by id as well, so chunks stored under a previous name are removed too
+        collection.delete(where={"$or": [{"id": id}, {"name": company_dict["name"]}]})
 
-        cache_data = self._read_cache()
-        if id in cache_data:
-            del cache_data[id]
-            self._write_cache(cache_data)
+        self.cache.delete(id)
 
     def add_document_to_vector_store(
         self,
         id: str,
         company: Company,
     ):
-        cache_data = self._read_cache()
+        self.add_documents_to_vector_store([(id, company)])
+
+    def add_documents_to_vector_store(
+        self,
+        companies: List[Tuple[str, Company]],
+    ) -> None:
+        """
+        Embed several companies with batched embedding calls and collection writes.
+        :param companies: Pairs of company id and company.
+        """
         collection = self.get_collection("company_profile_nomic")
         embedding_splitter = RecursiveCharacterTextSplitter(
             chunk_size=4000, chunk_overlap=0
         )
-        company_dict = self._get_company_dict(company)
-        metadata = self.add_document_to_collection(
-            collection,
-            embedding_splitter,
-            id,
-            company_dict,
+        documents = [(id, self._get_company_dict(company)) for id, company in companies]
+        self.add_documents_to_collection(collection, embedding_splitter, documents)
+        self.cache.upsert_many(
+            {id: self._cache_entry(id, company_dict) for id, company_dict in documents}
         )
-        cache_data.update({id: metadata})
-        self._write_cache(cache_data)
 
     def create_collection_from_scratch(
         self,
@@ -143,18 +220,27 @@ class VectorStoreService:
         self,
         collection_name: str,
         collection_metadata: dict = {},  # Eg. {"hnsw:space": "l2"}
-        embedding_model: OllamaEmbeddings = DEFAULT_EMBEDDING_MODEL,
-        source: PostgresConnector = PostgresConnector(),
+        embedding_model: Embeddings = DEFAULT_EMBEDDING_MODEL,
+        source: PostgresConnector = PostgresConnector(pooled=True),
         container: str = "companies",
         chunk_size: int = 512,
         cache: bool = True,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        sync: bool = False,
     ) -> chromadb.Collection:
         """
         Build a vector store collection.
+        Documents are ingested in batches of batch_size: their chunks are embedded and
+        written to the collection together, and progress is reported in documents per second.
+
+        With sync=True the existing collection is reconciled against the source instead of
+        rebuilt: documents are compared to the cache by hash, unchanged ones are skipped,
+        metadata-only changes are applied in place, changed or new documents are re-embedded
+        and documents that no longer exist in the source are removed.
         """
         print(f"BUILDING COLLECTION: {collection_name} USING {embedding_model.model}")
-        cache_data = self._read_cache()
-        self._store_old_collection(collection_name)
+        if not sync:
+            self._store_old_collection(collection_name)
         collection = self.create_collection(collection_name, collection_metadata)
         embedding_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size, chunk_overlap=0
@@ -165,23 +251,68 @@ class VectorStoreService:
             print(f"Failed to list blobs in container {container}: {e}")
             raise Exception(f"Failed to list blobs in container {container}: {e}")
 
+        start_time = time.perf_counter()
+        num_processed = 0
+        num_metadata_updates = 0
+        pending = []
+
+        def flush():
+            nonlocal num_processed
+            self.add_documents_to_collection(
+                collection, embedding_splitter, pending, embedding_model, batch_size
+            )
+            self.cache.upsert_many(
+                {blob: self._cache_entry(blob, profile) for blob, profile in pending}
+            )
+            num_processed += len(pending)
+            pending.clear()
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"Ingested {num_processed}/{len(company_profiles)} documents "
+                f"({num_processed / elapsed:.1f} docs/sec)"
+            )
+
         for id, blob in enumerate(company_profiles):
-            if cache and blob in cache_data:
+            if cache and not sync and blob in self.cache:
                 print(f"Skipping blob {blob} ({id + 1}/{len(company_profiles)})")
                 continue
 
-            print(f"Processing blob {blob} ({id + 1}/{len(company_profiles)})")
             try:
-                profile = source.read_json_document(container, blob)
+                profile = self._normalize_profile(
+                    source.read_json_document(container, blob)
+                )
             except Exception as e:
                 print(f"Failed to read blob {blob}: {e}")
                 continue
-            metadata = self.add_document_to_collection(
-                collection, embedding_splitter, blob, profile
-            )
 
-            cache_data.update({blob: metadata})
-            self._write_cache(cache_data)
+            if sync:
+                entry = self._cache_entry(blob, profile)
+                cached = self.cache.get(blob)
+                if cached is not None and cached.content_hash == entry.content_hash:
+                    if cached.metadata_hash != entry.metadata_hash:
+                        self._update_metadata_in_collection(collection, blob, entry.metadata)
+                        self.cache.upsert(blob, entry)
+                        num_metadata_updates += 1
+                    continue
+                if cached is not None:
+                    collection.delete(where={"id": blob})
+
+            pending.append((blob, profile))
+            if len(pending) >= batch_size:
+                flush()
+
+        if pending:
+            flush()
+
+        if sync:
+            removed = self.cache.ids() - set(company_profiles)
+            if removed:
+                collection.delete(where={"id": {"$in": list(removed)}})
+                self.cache.delete_many(removed)
+            print(
+                f"Synced {collection_name}: {num_processed} re-embedded, "
+                f"{num_metadata_updates} metadata updates, {len(removed)} removed"
+            )
 
         return collection
 
@@ -230,27 +361,98 @@ class VectorStoreService:
         query: str,
         collection_name: str,
         k: int = 5,
-        embedding_model: OllamaEmbeddings = DEFAULT_EMBEDDING_MODEL,
-        multiplier: int = 10,
+        embedding_model: Embeddings = DEFAULT_EMBEDDING_MODEL,
+        multiplier: int = 3,
         distance_metric: Literal["cosine", "l2", "ip"] = "l2",
+        query_embedding: Optional[List[float]] = None,
+        country: Optional[Union[str, List[str]]] = None,
+        industry: Optional[Union[str, List[str]]] = None,
+        risk_level: Optional[int] = None,
     ) -> List[dict]:
         """
-        Query a vector store collection.
+        Query a vector store collection for the k closest companies.
+        Chunks are fetched in growing pages, starting at k * multiplier, until k distinct
+        companies are found or the collection is exhausted.
+        :param query_embedding: Embedding of the query, if it was computed before.
+        :param country: Only return companies of this country (or of one of these countries);
+            likewise for industry and risk_level. The filters are applied by Chroma, before the nearest neighbour search.
+        :return: One result per company, best first. "Score" is the distance of its closest
+            chunk, "Aggregate_Score" the mean distance of its AGGREGATE_CHUNKS closest chunks.
         """
  
         collection = self.persistent_client.get_collection(collection_name)
         if collection is None:
             return []
   
-        embeddings = embedding_model.embed_query(query) 
-        result = collection.query(
-            query_embeddings=embeddings, n_results=k * multiplier, include=["distances", "metadatas"]
-        )
-        # Filter out duplicate metadata
-        unique_metadata = self._filter_unique_metadata_scores(result)
-    
-        #return unique_metadata
-        return unique_metadata[:k]
+        embeddings = query_embedding or embedding_model.embed_query(query)
+        where = self._build_where(country=country, industry=industry, risk_level=risk_level)
+        total = collection.count()
+        n_results = min(k * multiplier, total)
+        while n_results > 0:
+            result = collection.query(
+                query_embeddings=embeddings,
+                n_results=n_results,
+                where=where,
+                include=["distances", "metadatas"],
+            )
+            companies = self._group_by_company(result)
+            # Fewer chunks than asked for means the filtered collection is exhausted
+            if len(companies) >= k or n_results >= total or len(result["ids"][0]) < n_results:
+                return companies[:k]
+            n_results = min(n_results * 2, total)
+        return []
+
+    @staticmethod
+    def _build_where(**filters) -> Optional[dict]:
+        """
+        Chroma metadata filter matching all the given, non-empty filters.
+        """
+        conditions = []
+        for field, value in filters.items():
+            if value is None or value == "" or value == []:
+                continue
+            if isinstance(value, list):
+                conditions.append({field: {"$in": value}})
+            elif isinstance(value, int):
+                # Stored as a number or as a string, depending on how the company was added
+                conditions.append({"$or": [{field: value}, {field: str(value)}]})
+            else:
+                conditions.append({field: value})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    @classmethod
+    def _group_by_company(cls, query_result: QueryResult) -> List[dict]:
+        """
+        Group the chunks of a query result by company id, keeping the closest chunk of each.
+        """
+        distances = query_result.get("distances") or [[]]
+        metadatas = query_result.get("metadatas") or [[]]
+
+        # Chroma returns the chunks by ascending distance
+        companies = {}
+        for distance, metadata in sorted(zip(distances[0], metadatas[0]), key=lambda x: x[0]):
+            id = metadata.get("id") or metadata.get("website", "")
+            if id not in companies:
+                companies[id] = (metadata, [])
+            companies[id][1].append(distance)
+
+        results = []
+        for metadata, chunk_distances in companies.values():
+            closest = chunk_distances[: cls.AGGREGATE_CHUNKS]
+            results.append(
+                {
+                    "Id": metadata.get("id", ""),
+                    "Name": metadata.get("name", ""),
+                    "Country": metadata.get("country", ""),
+                    "Website": metadata.get("website", ""),
+                    "Score": chunk_distances[0],
+                    "Aggregate_Score": sum(closest) / len(closest),
+                    "Chunks": len(chunk_distances),
+                }
+            )
+        return results
 
     def _store_old_collection(self, collection_name: str):
         """
@@ -285,40 +487,3 @@ class VectorStoreService:
         except:
             collection = self.create_collection_from_scratch()
         return collection
-
-    @staticmethod
-    def _filter_unique_metadata_scores(query_result: QueryResult) -> List[dict]:
-        """
-        Filter out the unique metadata scores.
-        """
-        distances = query_result.get("distances", [])
-        distance = distances[0] if distances else []
-        metadatas = query_result.get("metadatas", [])
-        metadata = metadatas[0] if metadatas else []
-
-        # Pair each metadata with its distance and document id
-        paired_data = zip(distance, metadata)
-
-        # Sort by distance (ascending)
-        sorted_data = sorted(paired_data, key=lambda x: x[0])
-
-        # Use a dictionary to keep track of the unique metadata with the smallest distance
-        unique_metadata = {}
-        for distance, metadata in sorted_data:
-            metadata_key = tuple(metadata.items())
-            if metadata_key not in unique_metadata:
-                unique_metadata[metadata_key] = (metadata, distance)
-
-        # Convert the dictionary to a formatted list of dictionaries as per the requirement
-        unique_metadata_list = []
-        for metadata, distance in unique_metadata.values():
-            unique_metadata_list.append(
-                {
-                    "Name": metadata.get("name", ""),
-                    "Country": metadata.get("country", ""),
-                    "Website": metadata.get("website", ""),
-                    "Score": distance,
-                }
-            )
-
-        return unique_metadata_list
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Iterator, List
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.services.llm import llm_service
+from src.services.llm.llm_service import (
+    _pack,
+    _reduce_document_profiles,
+    _split_pages,
+)
+
+# With this template the summary prompt is the joined profiles, and max_chars is 90
+CONTEXT_SIZE = 50
+MAX_CHARS = 90
+
+
+def reduce(monkeypatch, profiles: List[str], summary: str = "s" * 60):
+    monkeypatch.setattr(llm_service, "DOCUMENT_PROFILE_SUMMARY_TEMPLATE", "{doc_text}")
+    monkeypatch.setattr(llm_service.llm_client, "CONTEXT_SIZE", CONTEXT_SIZE)
+    prompts = []
+
+    async def generate(prompt: str) -> str:
+        prompts.append(prompt)
+        return summary
+
+    result = asyncio.run(_reduce_document_profiles(profiles, generate))
+    return result, prompts
+
+
+def test_split_pages_carries_words_over_page_breaks():
+    words = [f"word{i:03}" for i in range(200)]
+    text = " ".join(words)
+    # Page breaks fall in the middle of words
+    pages = [text[start : start + 37] for start in range(0, len(text), 37)]
+    splitter = RecursiveCharacterTextSplitter(chunk_size=50, chunk_overlap=0)
+
+    chunks = list(_split_pages(pages, splitter, 50))
+
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == words
+
+
+def test_split_pages_is_lazy():
+    read = []
+
+    def pages() -> Iterator[str]:
+        for i in range(100):
+            read.append(i)
+            yield "lorem ipsum dolor sit amet " * 4
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=50, chunk_overlap=0)
+    chunks = _split_pages(pages(), splitter, 50)
+
+    assert next(chunks)
+    assert len(read) < 100
+
+
+def test_pack_groups_consecutive_profiles():
+    profiles = ["a" * 40, "b" * 40, "c" * 40, "d" * 100]
+
+    groups = _pack(profiles, MAX_CHARS)
+
+    assert groups == [["a" * 40, "b" * 40], ["c" * 40], ["d" * 100]]
+
+
+def test_reduce_single_profile_makes_no_calls(monkeypatch):
+    (profile, rounds, calls), prompts = reduce(monkeypatch, ["only"])
+
+    assert (profile, rounds, calls) == ("only", 0, 0)
+    assert prompts == []
+
+
+def test_reduce_shortens_profiles_when_no_two_fit(monkeypatch):
+    # 60 + 1 + 60 characters do not fit into one prompt, so each round would
+    # summarize every profile alone without the progress guard
+    (profile, rounds, calls), prompts = reduce(monkeypatch, ["a" * 60, "b" * 60, "c" * 60])
+
+    assert profile == "s" * 60
+    assert (rounds, calls) == (2, 3)
+    assert prompts[0] == "a" * 44 + "\n" + "b" * 44
+    assert all(len(prompt) <= MAX_CHARS for prompt in prompts)
+
+
+def test_reduce_truncates_profiles_to_max_chars(monkeypatch):
+    (profile, rounds, calls), prompts = reduce(monkeypatch, ["a" * 500, "b" * 5, "c" * 5])
+
+    assert (rounds, calls) == (2, 3)
+    assert prompts[:2] == ["a" * MAX_CHARS, "b" * 5 + "\n" + "c" * 5]
@@ -0,0 +1,36 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+import asyncio
+import logging
+import signal
+
+from src.connectors.http_client import close_session
+from src.connectors.postgres_conector import PostgresConnector
+from src.services.document_service import db, site_listener
+from src.services.job_queue import JobQueue, JobWorker
+from src.services.jobs import JOB_HANDLERS
+from src.utils.logger_config import setup_logging
+
+# Set up logging
+setup_logging()
+logger = logging.getLogger()  # Get root logger
+
+
+async def main():
+    worker = JobWorker(JobQueue(db), JOB_HANDLERS)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await site_listener.close()
+        await close_session()
+        await db.close()
+        PostgresConnector.close_pools()
+
+
+if __name__ == "__main__":
+    print("Starting job worker...")
+    asyncio.run(main())